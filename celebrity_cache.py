@@ -0,0 +1,189 @@
+from pymongo import MongoClient
+from datetime import datetime, timedelta
+import threading
+import time
+
+from schema import Schema
+
+RECENT_POST_FIELDS = {"_id": 1, "userId": 1, "content": 1, "createdAt": 1, "likeCount": 1, "commentCount": 1, "topicId": 1}
+
+
+class CelebrityPostCache:
+    def __init__(self, connection_string="mongodb://localhost:27017/", compact_schema=False,
+                 follower_threshold=1000, refresh_seconds=300, ttl_seconds=30):
+        """
+        Per-author cache of the last 24 hours of posts of authors with many followers.
+        The posts are stored hydrated (username and topicName), so a feed read
+        for a celebrity costs nothing once cached instead of every follower
+        hitting the same {userId, createdAt} range of one shard.
+        :param connection_string: MongoDB connection string
+        :param compact_schema: Read the compact schema v2 collections
+        :param follower_threshold: Number of followers from which an author is cached
+        :param refresh_seconds: How often the set of celebrities is recomputed, in the
+                                background while the previous set keeps being served
+        :param ttl_seconds: Age after which a cached list is reloaded; bounds how stale
+                            posts written by other processes and like/comment counts get
+        """
+        self.client = MongoClient(connection_string)
+        self.db = self.client["social_network"]
+        self.schema = Schema(compact_schema)
+
+        self.users = self.db["users"]
+        self.topics = self.db["topics"]
+        self.friendships = self.schema.collection(self.db, "friendships")
+        self.posts = self.schema.collection(self.db, "posts")
+
+        self.follower_threshold = follower_threshold
+        self.refresh_seconds = refresh_seconds
+        self.ttl_seconds = ttl_seconds
+
+        self.lock = threading.Lock()
+        self.celebrities = set()
+        self.celebrities_refreshed_at = None
+        self.celebrities_refreshing = False
+        self.celebrities_ready = threading.Event()
+        self.recent_posts = {}
+        # Author id -> Event set once the list being loaded for it is in
+        self.loading = {}
+
+    def refresh_celebrities(self):
+        """Recompute the authors with at least follower_threshold followers"""
+        s = self.schema
+        counts = self.friendships.aggregate([
+            {"$group": {"_id": "$" + s.f("friendId"), "followers": {"$sum": 1}}},
+            {"$match": {"followers": {"$gte": self.follower_threshold}}}
+        ])
+        celebrities = {row["_id"] for row in counts}
+
+        with self.lock:
+            self.celebrities = celebrities
+            self.celebrities_refreshed_at = time.monotonic()
+            for author_id in list(self.recent_posts):
+                if author_id not in celebrities:
+                    del self.recent_posts[author_id]
+
+    def _refresh_celebrities_once(self):
+        """Run one refresh_celebrities() on behalf of every caller that needed it"""
+        try:
+            self.refresh_celebrities()
+        finally:
+            with self.lock:
+                self.celebrities_refreshing = False
+            self.celebrities_ready.set()
+
+    def _current_celebrities(self, wait=True):
+        """
+        The set of celebrities, recomputed at most once at a time. Only the
+        first computation is waited for; later ones run in a background
+        thread while the previous set is served.
+        :param wait: Wait for the first computation; if False it runs in the
+                     background too and the empty set is returned meanwhile
+        """
+        with self.lock:
+            refreshed_at = self.celebrities_refreshed_at
+            if refreshed_at is not None and time.monotonic() - refreshed_at < self.refresh_seconds:
+                return self.celebrities
+            start = not self.celebrities_refreshing
+            self.celebrities_refreshing = True
+
+        if refreshed_at is None and wait:
+            if start:
+                self._refresh_celebrities_once()
+            else:
+                self.celebrities_ready.wait()
+        elif start:
+            threading.Thread(target=self._refresh_celebrities_once, daemon=True).start()
+        return self.celebrities
+
+    def split_celebrities(self, author_ids):
+        """
+        Split author ids into celebrities and everyone else
+        :return: (celebrity ids, other ids)
+        """
+        celebrities = self._current_celebrities()
+        return ([author_id for author_id in author_ids if author_id in celebrities],
+                [author_id for author_id in author_ids if author_id not in celebrities])
+
+    def _load(self, author_ids):
+        """
+        Load and hydrate the last 24 hours of posts of some authors in three round trips.
+        A list is only replaced by one whose query started later, so a slow
+        load cannot overwrite a fresher list loaded meanwhile.
+        """
+        s = self.schema
+        started_at = time.monotonic()
+        last_24_hours = datetime.now() - timedelta(hours=24)
+        posts = s.decode_all(list(self.posts.find(
+            {s.f("userId"): {"$in": author_ids}, s.f("createdAt"): {"$gte": last_24_hours}},
+            s.fields(RECENT_POST_FIELDS)
+        ).sort(s.f("createdAt"), -1)))
+
+        users = {user["_id"]: user for user in self.users.find({"_id": {"$in": author_ids}}, {"username": 1})}
+        topic_ids = list({post["topicId"] for post in posts})
+        topics = {topic["_id"]: topic for topic in self.topics.find({"_id": {"$in": topic_ids}}, {"name": 1})} if topic_ids else {}
+
+        by_author = {author_id: [] for author_id in author_ids}
+        for post in posts:
+            if post["userId"] in users:
+                post["username"] = users[post["userId"]]["username"]
+            if post["topicId"] in topics:
+                post["topicName"] = topics[post["topicId"]]["name"]
+            by_author[post["userId"]].append(post)
+
+        with self.lock:
+            for author_id, author_posts in by_author.items():
+                cached = self.recent_posts.get(author_id)
+                if cached is None or cached[0] < started_at:
+                    self.recent_posts[author_id] = (started_at, author_posts)
+
+    def get_recent_posts(self, author_ids):
+        """
+        Get the cached last-24-hour posts of celebrity authors, loading missing or expired lists.
+        Each list is loaded by one request at a time: while an expired list
+        is reloaded the other requests serve the expired copy, and only
+        requests for a list that was never loaded wait for it.
+        :param author_ids: Celebrity author ids, see split_celebrities()
+        :return: List of hydrated posts, newest first within each author
+        """
+        now = time.monotonic()
+        to_load, waiting = [], []
+        with self.lock:
+            for author_id in author_ids:
+                cached = self.recent_posts.get(author_id)
+                if cached is not None and now - cached[0] < self.ttl_seconds:
+                    continue
+                if author_id not in self.loading:
+                    self.loading[author_id] = threading.Event()
+                    to_load.append(author_id)
+                elif cached is None:
+                    waiting.append(self.loading[author_id])
+
+        if to_load:
+            try:
+                self._load(to_load)
+            finally:
+                with self.lock:
+                    for author_id in to_load:
+                        self.loading.pop(author_id).set()
+        for loaded in waiting:
+            loaded.wait()
+
+        last_24_hours = datetime.now() - timedelta(hours=24)
+        posts = []
+        with self.lock:
+            for author_id in author_ids:
+                _, author_posts = self.recent_posts.get(author_id, (None, []))
+                # Copies, so callers cannot modify the shared lists
+                posts.extend(dict(post) for post in author_posts if post["createdAt"] >= last_24_hours)
+        return posts
+
+    def refresh_authors(self, author_ids):
+        """
+        Reload the cached posts of the given authors that are celebrities, e.g. after they post.
+        Never waits for the celebrities to be computed: until they are, the
+        computation is started in the background and nothing is reloaded.
+        """
+        celebrities = self._current_celebrities(wait=False)
+        celebrities = [author_id for author_id in set(author_ids) if author_id in celebrities]
+        if celebrities:
+            self._load(celebrities)
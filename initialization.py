@@ -4,6 +4,9 @@ from datetime import datetime, timedelta
 import random
 import string
 
+from user_stats import UserStatsRollup
+from snapshot import export_snapshot, DEFAULT_SNAPSHOT_PATH
+
 class SocialNetworkDB:
     def __init__(self, connection_string="mongodb://localhost:27017/"):
         """Initialize connection to MongoDB"""
@@ -17,6 +20,7 @@ class SocialNetworkDB:
         self.posts = self.db["posts"]
         self.likes = self.db["likes"]
         self.comments = self.db["comments"]
+        self.user_stats = UserStatsRollup(self.db)
         
         # Ensure indexes (in addition to those created in setup script)
         self._create_indexes()
@@ -40,6 +44,7 @@ class SocialNetworkDB:
         self.posts.delete_many({})
         self.likes.delete_many({})
         self.comments.delete_many({})
+        self.user_stats.user_stats.delete_many({})
         
         # Generate users
         user_ids = []
@@ -88,6 +93,7 @@ class SocialNetworkDB:
         
         # Generate posts
         post_ids = []
+        post_authors = {}
         print("Creating posts...")
         for user_id in user_ids:
             num_posts = random.randint(5, max_posts_per_user)
@@ -106,12 +112,16 @@ class SocialNetworkDB:
                     "commentCount": 0
                 })
                 post_ids.append(result.inserted_id)
+                post_authors[result.inserted_id] = user_id
                 
                 # Update topic post count
                 self.topics.update_one(
                     {"_id": topic_id},
                     {"$inc": {"postCount": 1}}
                 )
+                
+                # Update author stats
+                self.user_stats.record_post(user_id)
         
         # Generate likes
         print("Creating likes...")
@@ -131,6 +141,9 @@ class SocialNetworkDB:
                     {"_id": post_id},
                     {"$inc": {"likeCount": 1}}
                 )
+                
+                # Update post author stats
+                self.user_stats.record_like(post_authors[post_id])
         
         # Generate comments
         print("Creating comments...")
@@ -152,6 +165,9 @@ class SocialNetworkDB:
                     {"_id": post_id},
                     {"$inc": {"commentCount": 1}}
                 )
+                
+                # Update commenter and post author stats
+                self.user_stats.record_comment(user_id, post_authors[post_id])
         
         print("Data generation complete!")
         print(f"Created {len(user_ids)} users, {len(topic_ids)} topics, {len(post_ids)} posts")
@@ -169,4 +185,7 @@ if __name__ == "__main__":
     sample_ids = db.generate_data()
     print(f"Sample user ID: {sample_ids['sample_user_id']}")
     print(f"Sample topic ID: {sample_ids['sample_topic_id']}")
-    print(f"Sample post ID: {sample_ids['sample_post_id']}")
\ No newline at end of file
+    print(f"Sample post ID: {sample_ids['sample_post_id']}")
+    
+    # Save the dataset so later runs can restore it instead of regenerating
+    export_snapshot(db.db, DEFAULT_SNAPSHOT_PATH, sample_ids=sample_ids)
\ No newline at end of file
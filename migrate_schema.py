@@ -0,0 +1,248 @@
+from pymongo import MongoClient, IndexModel, ReplaceOne, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import time
+
+from schema import Schema, COMPACT_COLLECTIONS, index_specs
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class SchemaMigration:
+    def __init__(self, db, batch_size=1000, num_workers=4):
+        """
+        Online migration of the v1 collections to the compact schema v2.
+        The cluster time is recorded before a collection's first copy starts,
+        then its documents are copied in _id order, in batches, into the *_v2
+        collection while the v1 collection keeps serving traffic. Afterwards
+        the collection's change stream is replayed from that time, so inserts
+        (whatever their _id), updates such as counter $incs and deletes made
+        during or after the copy reach v2 as well. Each run resumes the
+        change stream where the previous one stopped and returns once it has
+        caught up. Needs a replica set or sharded cluster for change streams.
+        :param db: pymongo Database holding the social network collections
+        :param batch_size: Number of documents copied per insert_many and
+                           changes replayed per bulk write
+        :param num_workers: Number of collections migrated concurrently
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.v1 = Schema(compact=False)
+        self.v2 = Schema(compact=True)
+        self.state = db["schema_migrations"]
+
+    def _create_indexes(self, name):
+        """Create the indexes of a collection on its compact counterpart"""
+        models = [IndexModel([(self.v2.f(field), direction) for field, direction in keys], **options)
+                  for keys, options in index_specs(name)]
+        if models:
+            self.v2.collection(self.db, name).create_indexes(models)
+
+    def _start(self, name):
+        """
+        Record the cluster time before the first copy of a collection
+        :return: Migration state document of the collection
+        """
+        state = self.state.find_one({"_id": name})
+        if state is None:
+            operation_time = self.db.command("ping").get("operationTime")
+            if operation_time is None:
+                raise RuntimeError("Online schema migration needs a replica set or sharded cluster")
+            self.state.update_one(
+                {"_id": name},
+                {"$setOnInsert": {"startedAt": operation_time, "copied": False, "resumeToken": None}},
+                upsert=True
+            )
+            state = self.state.find_one({"_id": name})
+        return state
+
+    def _copy(self, source, target):
+        """Copy the documents after the highest _id already in the target"""
+        last = target.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        last_id = last["_id"] if last else None
+
+        copied = 0
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            batch = list(source.find(query).sort("_id", 1).limit(self.batch_size))
+            if not batch:
+                break
+
+            try:
+                target.insert_many([self.v2.fields(doc) for doc in batch], ordered=False)
+                copied += len(batch)
+            except BulkWriteError as e:
+                # Documents copied by a concurrent run are skipped
+                errors = e.details["writeErrors"]
+                if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+                    raise
+                copied += e.details["nInserted"]
+
+            last_id = batch[-1]["_id"]
+
+        return copied
+
+    def _stored_path(self, path):
+        """Compact name of a possibly dotted field path"""
+        head, dot, rest = path.partition(".")
+        return self.v2.f(head) + dot + rest
+
+    def _shard_key(self, collection):
+        """Shard key fields of a collection, empty if it is not sharded"""
+        try:
+            sharding = self.db.client["config"]["collections"].find_one(
+                {"_id": f"{self.db.name}.{collection.name}", "dropped": {"$ne": True}})
+        except OperationFailure:
+            sharding = None
+        return list(sharding["key"]) if sharding else []
+
+    def _replay_operation(self, change, shard_key):
+        """Translate a change stream event on v1 into a write on v2"""
+        _id = change["documentKey"]["_id"]
+        if change["operationType"] in ("insert", "replace"):
+            doc = self.v2.fields(change["fullDocument"])
+            # Upserts on a sharded collection need the full shard key in the filter
+            query = {"_id": _id, **{field: doc[field] for field in shard_key if field in doc}}
+            return ReplaceOne(query, doc, upsert=True)
+        if change["operationType"] == "update":
+            description = change["updateDescription"]
+            update = {}
+            if description.get("updatedFields"):
+                update["$set"] = {self._stored_path(path): value
+                                  for path, value in description["updatedFields"].items()}
+            if description.get("removedFields"):
+                update["$unset"] = {self._stored_path(path): "" for path in description["removedFields"]}
+            return UpdateOne({"_id": _id}, update) if update else None
+        if change["operationType"] == "delete":
+            return DeleteOne({"_id": _id})
+        raise RuntimeError(f"Cannot migrate {change['ns']['coll']} after a {change['operationType']} event")
+
+    def _replay(self, name, source, target, state):
+        """
+        Apply the changes made to the source since the copy started, up to the
+        cluster time at which the replay started; changes made after it are left
+        for the next run, so the replay ends even while the source keeps being written
+        :return: Number of changes replayed
+        """
+        shard_key = self._shard_key(target)
+        if state["resumeToken"] is not None:
+            options = {"resume_after": state["resumeToken"]}
+        else:
+            options = {"start_at_operation_time": state["startedAt"]}
+
+        replayed = 0
+        with source.watch(max_await_time_ms=100, **options) as stream:
+            end_time = self.db.command("ping")["operationTime"]
+            caught_up = False
+            while not caught_up:
+                operations = []
+                change = stream.try_next()
+                while change is not None:
+                    operation = self._replay_operation(change, shard_key)
+                    if operation is not None:
+                        operations.append(operation)
+                    replayed += 1
+                    if change["clusterTime"] >= end_time or len(operations) >= self.batch_size:
+                        break
+                    change = stream.try_next()
+
+                # Ordered, so changes to the same document apply in stream order
+                if operations:
+                    target.bulk_write(operations, ordered=True)
+                self.state.update_one({"_id": name}, {"$set": {"resumeToken": stream.resume_token}})
+                caught_up = change is None or change["clusterTime"] >= end_time
+        return replayed
+
+    def migrate_collection(self, name):
+        """
+        Bring the compact counterpart of one collection up to date
+        :param name: v1 collection name
+        :return: Dict with the number of documents copied and changes replayed
+        """
+        source = self.v1.collection(self.db, name)
+        target = self.v2.collection(self.db, name)
+        self._create_indexes(name)
+
+        state = self._start(name)
+        copied = 0
+        if not state["copied"]:
+            copied = self._copy(source, target)
+            self.state.update_one({"_id": name}, {"$set": {"copied": True}})
+
+        return {"copied": copied, "replayed": self._replay(name, source, target, state)}
+
+    def run(self):
+        """
+        Migrate all compacted collections
+        :return: Dict of collection name -> {"copied": documents, "replayed": changes}
+        """
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            futures = {name: executor.submit(self.migrate_collection, name) for name in COMPACT_COLLECTIONS}
+            return {name: future.result() for name, future in futures.items()}
+
+    def _collection_stats(self, collection):
+        """Size figures of a collection, zero if it does not exist yet"""
+        try:
+            stats = self.db.command("collStats", collection.name)
+        except OperationFailure:
+            stats = {}
+        data_size = stats.get("size", 0)
+        index_size = stats.get("totalIndexSize", 0)
+        return {
+            "count": stats.get("count", 0),
+            "avgObjSize": stats.get("avgObjSize", 0),
+            "dataSize": data_size,
+            "storageSize": stats.get("storageSize", 0),
+            "indexSize": index_size,
+            # Uncompressed data plus indexes is what has to fit in cache
+            # for the collection to be fully memory resident
+            "workingSetSize": data_size + index_size
+        }
+
+    def storage_report(self):
+        """
+        Compare storage and working-set size of the v1 and compact collections
+        :return: Dict of collection name -> {"v1": stats, "v2": stats}
+        """
+        report = {}
+        for name in COMPACT_COLLECTIONS:
+            report[name] = {
+                "v1": self._collection_stats(self.v1.collection(self.db, name)),
+                "v2": self._collection_stats(self.v2.collection(self.db, name))
+            }
+        return report
+
+
+def print_storage_report(report):
+    """Print a storage report as a before/after table"""
+    print(f"{'collection':<12} {'metric':<15} {'v1':>14} {'v2':>14} {'saved':>8}")
+    for name, sizes in report.items():
+        for metric in ("count", "avgObjSize", "dataSize", "storageSize", "indexSize", "workingSetSize"):
+            before = sizes["v1"][metric]
+            after = sizes["v2"][metric]
+            saved = f"{(1 - after / before) * 100:.1f}%" if before and metric != "count" else ""
+            print(f"{name:<12} {metric:<15} {before:>14.0f} {after:>14.0f} {saved:>8}")
+
+
+# Migrate the social_network database to the compact schema
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate posts, likes, comments and friendships to the compact schema v2")
+    parser.add_argument("--connection-string", default="mongodb://localhost:27017/")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--report-only", action="store_true")
+    args = parser.parse_args()
+
+    client = MongoClient(args.connection_string)
+    migration = SchemaMigration(client["social_network"], batch_size=args.batch_size, num_workers=args.workers)
+
+    if not args.report_only:
+        start_time = time.time()
+        copied = migration.run()
+        for name, counts in copied.items():
+            print(f"Copied {counts['copied']} documents and replayed {counts['replayed']} changes from {name}")
+        print(f"Migration time: {time.time() - start_time:.2f} seconds")
+
+    print_storage_report(migration.storage_report())
@@ -3,29 +3,34 @@
 
 # Define base directory
 BASE=~/mongodb
-mkdir -p "$BASE/configserver" "$BASE/shard1" "$BASE/shard2" "$BASE/router"
+mkdir -p "$BASE/configserver" "$BASE/shard1" "$BASE/shard1b" "$BASE/shard1c" "$BASE/shard2" "$BASE/shard2b" "$BASE/shard2c" "$BASE/router"
 
 # Start Config Server
 mongod --configsvr --replSet configReplSet --dbpath "$BASE/configserver" --port 27019 --logpath "$BASE/configserver/config.log" &
 sleep 5
 mongo --port 27019 --eval 'rs.initiate({_id: "configReplSet", configsvr: true, members: [{_id: 0, host: "localhost:27019"}]})'
 
-# Start Shard 1
+# Start Shard 1 (a primary and two secondaries, which serve the
+# "bounded" and "eventual" reads of SocialNetworkQueries)
 mongod --shardsvr --replSet shard1ReplSet --dbpath "$BASE/shard1" --port 27020 --logpath "$BASE/shard1/shard1.log" &
+mongod --shardsvr --replSet shard1ReplSet --dbpath "$BASE/shard1b" --port 27022 --logpath "$BASE/shard1b/shard1b.log" &
+mongod --shardsvr --replSet shard1ReplSet --dbpath "$BASE/shard1c" --port 27023 --logpath "$BASE/shard1c/shard1c.log" &
 sleep 5
-mongo --port 27020 --eval 'rs.initiate({_id: "shard1ReplSet", members: [{_id: 0, host: "localhost:27020"}]})'
+mongo --port 27020 --eval 'rs.initiate({_id: "shard1ReplSet", members: [{_id: 0, host: "localhost:27020", priority: 2}, {_id: 1, host: "localhost:27022"}, {_id: 2, host: "localhost:27023"}]})'
 
 # Start Shard 2
 mongod --shardsvr --replSet shard2ReplSet --dbpath "$BASE/shard2" --port 27021 --logpath "$BASE/shard2/shard2.log" &
+mongod --shardsvr --replSet shard2ReplSet --dbpath "$BASE/shard2b" --port 27024 --logpath "$BASE/shard2b/shard2b.log" &
+mongod --shardsvr --replSet shard2ReplSet --dbpath "$BASE/shard2c" --port 27025 --logpath "$BASE/shard2c/shard2c.log" &
 sleep 5
-mongo --port 27021 --eval 'rs.initiate({_id: "shard2ReplSet", members: [{_id: 0, host: "localhost:27021"}]})'
+mongo --port 27021 --eval 'rs.initiate({_id: "shard2ReplSet", members: [{_id: 0, host: "localhost:27021", priority: 2}, {_id: 1, host: "localhost:27024"}, {_id: 2, host: "localhost:27025"}]})'
 
 # Start Mongos Router
 mongos --configdb configReplSet/localhost:27019 --port 27017 --logpath "$BASE/router/mongos.log" &
 sleep 5
 
 # Add shards to Mongos
-mongo --port 27017 --eval 'sh.addShard("shard1ReplSet/localhost:27020"); sh.addShard("shard2ReplSet/localhost:27021");'
+mongo --port 27017 --eval 'sh.addShard("shard1ReplSet/localhost:27020,localhost:27022,localhost:27023"); sh.addShard("shard2ReplSet/localhost:27021,localhost:27024,localhost:27025");'
 mongo --port 27017 --eval 'sh.enableSharding("social_network")'
 
 # Shard the collections
@@ -47,15 +52,32 @@ sh.shardCollection("social_network.comments", {postId: 1});
 
 // Create indexes
 db.posts.createIndex({userId: 1, createdAt: -1});
+db.posts.createIndex({userId: 1, likeCount: -1});
+db.posts.createIndex({userId: 1, commentCount: -1});
 db.posts.createIndex({topicId: 1, createdAt: -1});
+db.posts.createIndex({topicId: 1, content: "text"});
 db.posts.createIndex({likeCount: -1});
 db.posts.createIndex({commentCount: -1});
 
 db.comments.createIndex({userId: 1, createdAt: -1});
+db.likes.createIndex({postId: 1, userId: 1}, {unique: true});
 db.topics.createIndex({postCount: -1});
 
 db.friendships.createIndex({userId: 1});
 db.friendships.createIndex({friendId: 1});
+
+// Compact schema v2 collections with short field names (see schema.py and migrate_schema.py)
+db.createCollection("posts_v2");
+sh.shardCollection("social_network.posts_v2", {u: 1, c: -1});
+
+db.createCollection("friendships_v2");
+sh.shardCollection("social_network.friendships_v2", {u: 1});
+
+db.createCollection("likes_v2");
+sh.shardCollection("social_network.likes_v2", {p: 1});
+
+db.createCollection("comments_v2");
+sh.shardCollection("social_network.comments_v2", {p: 1});
 EOF
 
 echo "✅ MongoDB sharded cluster setup complete!"
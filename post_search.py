@@ -0,0 +1,125 @@
+from collections import OrderedDict, defaultdict
+import re
+import threading
+import time
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens of a text"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def is_simple_search(text):
+    """Phrase and negation searches are only answered by the server text index"""
+    return '"' not in text and not any(term.startswith("-") for term in text.split())
+
+
+class TopicSearchIndex:
+    def __init__(self, posts):
+        """
+        In-process inverted index over the content of one topic's posts
+        :param posts: Hydrated posts of the topic (with _id and content)
+        """
+        self.posts = {post["_id"]: post for post in posts}
+        self.postings = defaultdict(dict)
+        self.lengths = {}
+        for post in posts:
+            tokens = tokenize(post["content"])
+            self.lengths[post["_id"]] = len(tokens) or 1
+            for token in tokens:
+                self.postings[token][post["_id"]] = self.postings[token].get(post["_id"], 0) + 1
+        self.built_at = time.monotonic()
+
+    def search(self, text, k=10, after=None):
+        """
+        Relevance-ranked top k posts containing any of the search terms.
+        Scores are term frequencies normalized by post length, an
+        approximation of the server textScore without stemming.
+        :param after: (score, _id) of the last post of the previous page
+        :return: List of posts with a score field, best first
+        """
+        scores = defaultdict(float)
+        for term in set(tokenize(text)):
+            for post_id, count in self.postings.get(term, {}).items():
+                scores[post_id] += count / self.lengths[post_id]
+
+        ranked = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        if after is not None:
+            after_score, after_id = after
+            ranked = [(post_id, score) for post_id, score in ranked
+                      if score < after_score or (score == after_score and post_id < after_id)]
+
+        return [dict(self.posts[post_id], score=score) for post_id, score in ranked[:k]]
+
+
+class HotTopicSearchCache:
+    def __init__(self, hot_threshold=3, max_topics=16, ttl_seconds=60, max_counted_topics=1024):
+        """
+        LRU cache of inverted indexes for frequently searched topics
+        :param hot_threshold: Number of searches after which a topic gets an index
+        :param max_topics: Maximum number of topic indexes kept in memory
+        :param ttl_seconds: Age after which an index is rebuilt from the database
+        :param max_counted_topics: Maximum number of topics whose searches are counted;
+                                   the least recently searched are forgotten
+        """
+        self.hot_threshold = hot_threshold
+        self.max_topics = max_topics
+        self.ttl_seconds = ttl_seconds
+        self.indexes = OrderedDict()
+        self.max_counted_topics = max_counted_topics
+        self.search_counts = OrderedDict()
+        # Topic id -> Event set once the index being built for it is in
+        self.building = {}
+        self.lock = threading.Lock()
+
+    def invalidate(self, topic_id):
+        """Drop the index of a topic, e.g. after a post on it was written"""
+        with self.lock:
+            self.indexes.pop(topic_id, None)
+
+    def get(self, topic_id, load_posts, require=False):
+        """
+        Get the index of a topic, building it once the topic is hot.
+        Each index is built by one search at a time: the other searches of
+        the topic go to the server meanwhile, or wait for it if they require it.
+        :param load_posts: Function returning the hydrated posts of the topic
+        :param require: Build the index even if the topic is not hot
+        :return: TopicSearchIndex, or None if the topic should be searched on the server
+        """
+        with self.lock:
+            search_count = self.search_counts.pop(topic_id, 0) + 1
+            self.search_counts[topic_id] = search_count
+            while len(self.search_counts) > self.max_counted_topics:
+                self.search_counts.popitem(last=False)
+            index = self.indexes.get(topic_id)
+            if index is not None and time.monotonic() - index.built_at < self.ttl_seconds:
+                self.indexes.move_to_end(topic_id)
+                return index
+            if not require and search_count < self.hot_threshold:
+                return None
+            building = self.building.get(topic_id)
+            if building is None:
+                self.building[topic_id] = threading.Event()
+            elif not require:
+                return None
+
+        if building is not None:
+            building.wait()
+            with self.lock:
+                index = self.indexes.get(topic_id)
+            # The build failed; build one for this search only
+            return index if index is not None else TopicSearchIndex(load_posts())
+
+        try:
+            index = TopicSearchIndex(load_posts())
+            with self.lock:
+                self.indexes[topic_id] = index
+                self.indexes.move_to_end(topic_id)
+                while len(self.indexes) > self.max_topics:
+                    self.indexes.popitem(last=False)
+        finally:
+            with self.lock:
+                self.building.pop(topic_id).set()
+        return index
@@ -6,6 +6,13 @@ from datetime import datetime, timedelta
 client = MongoClient('mongodb://localhost:27017/')
 db = client['social_network']
 
+def _find_by_ids(collection, ids, projection):
+    """Fetch documents by _id in a single round trip, as a dict of _id -> document"""
+    ids = list(set(ids))
+    if not ids:
+        return {}
+    return {doc["_id"]: doc for doc in collection.find({"_id": {"$in": ids}}, projection)}
+
 def get_all_posts_by_user(user_id):
     """Query 1: Get all posts of a user"""
     if isinstance(user_id, str):
@@ -53,8 +60,9 @@ def get_all_comments_by_user(user_id):
     ).sort("createdAt", -1))
     
     # Enhance comments with post information
+    posts = _find_by_ids(db.posts, [comment["postId"] for comment in comments], {"content": 1, "userId": 1})
     for comment in comments:
-        post = db.posts.find_one({"_id": comment["postId"]}, {"content": 1, "userId": 1})
+        post = posts.get(comment["postId"])
         if post:
             comment["postContent"] = post["content"][:50] + "..." if len(post["content"]) > 50 else post["content"]
             comment["postAuthorId"] = post["userId"]
@@ -6,6 +6,13 @@ from datetime import datetime, timedelta
 client = MongoClient('mongodb://localhost:27017/')
 db = client['social_network']
 
+def _find_by_ids(collection, ids, projection):
+    """Fetch documents by _id in a single round trip, as a dict of _id -> document"""
+    ids = list(set(ids))
+    if not ids:
+        return {}
+    return {doc["_id"]: doc for doc in collection.find({"_id": {"$in": ids}}, projection)}
+
 def get_all_posts_on_topic(topic_id):
     """Query 5: Get all posts on a topic"""
     if isinstance(topic_id, str):
@@ -17,8 +24,9 @@ def get_all_posts_on_topic(topic_id):
     ).sort("createdAt", -1))
     
     # Enhance posts with user information
+    users = _find_by_ids(db.users, [post["userId"] for post in posts], {"username": 1})
     for post in posts:
-        user = db.users.find_one({"_id": post["userId"]}, {"username": 1})
+        user = users.get(post["userId"])
         if user:
             post["username"] = user["username"]
     
@@ -61,12 +69,14 @@ def get_friend_posts_last_24_hours(user_id):
     ).sort("createdAt", -1))
     
     # Enhance posts with user and topic information
+    users = _find_by_ids(db.users, [post["userId"] for post in posts], {"username": 1})
+    topics = _find_by_ids(db.topics, [post["topicId"] for post in posts], {"name": 1})
     for post in posts:
-        user = db.users.find_one({"_id": post["userId"]}, {"username": 1})
+        user = users.get(post["userId"])
         if user:
             post["username"] = user["username"]
         
-        topic = db.topics.find_one({"_id": post["topicId"]}, {"name": 1})
+        topic = topics.get(post["topicId"])
         if topic:
             post["topicName"] = topic["name"]
     
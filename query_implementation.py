@@ -1,154 +1,386 @@
 from pymongo import MongoClient
+from pymongo.read_preferences import Primary, SecondaryPreferred
 from bson.objectid import ObjectId
 from datetime import datetime, timedelta
 
+from user_stats import UserStatsRollup
+from schema import Schema
+from post_search import is_simple_search
+
+SEARCH_POST_FIELDS = {"_id": 1, "userId": 1, "content": 1, "createdAt": 1, "likeCount": 1, "commentCount": 1}
+
+# Consistency classes: "strong" reads go to the primary, "bounded" reads may be
+# served by a secondary lagging at most max_staleness_seconds behind, and
+# "eventual" reads by any secondary
+CONSISTENCY_CLASSES = ("strong", "bounded", "eventual")
+
+MIN_MAX_STALENESS_SECONDS = 90
+
+DEFAULT_CONSISTENCY = {
+    "get_all_posts_by_user": "bounded",
+    "get_top_k_most_liked_posts_by_user": "bounded",
+    "get_top_k_most_commented_posts_by_user": "bounded",
+    "get_all_comments_by_user": "bounded",
+    "get_all_posts_on_topic": "eventual",
+    "get_top_k_popular_topics": "eventual",
+    "get_friend_posts_last_24_hours": "strong",
+    "get_user_stats": "bounded",
+    "search_posts_on_topic": "eventual"
+}
+
 class SocialNetworkQueries:
-    def __init__(self, connection_string="mongodb://localhost:27017/"):
-        """Initialize connection to MongoDB"""
+    def __init__(self, connection_string="mongodb://localhost:27017/", compact_schema=False,
+                 search_cache=None, consistency=None, max_staleness_seconds=90,
+                 celebrity_cache=None):
+        """
+        Initialize connection to MongoDB
+        :param connection_string: MongoDB connection string
+        :param compact_schema: Read the compact schema v2 collections (see migrate_schema.py);
+                               results keep the v1 field names either way
+        :param search_cache: Optional post_search.HotTopicSearchCache answering searches
+                             on hot topics in-process
+        :param consistency: Dict of query method name -> consistency class, overriding
+                            DEFAULT_CONSISTENCY
+        :param max_staleness_seconds: Staleness bound of "bounded" reads (90 at least)
+        :param celebrity_cache: Optional celebrity_cache.CelebrityPostCache serving the
+                                recent posts of authors with many followers in Query 7
+        """
         self.client = MongoClient(connection_string)
         self.db = self.client["social_network"]
+        self.schema = Schema(compact_schema)
+        self.search_cache = search_cache
+        self.celebrity_cache = celebrity_cache
         
         # Access collections
         self.users = self.db["users"]
-        self.friendships = self.db["friendships"]
+        self.friendships = self.schema.collection(self.db, "friendships")
         self.topics = self.db["topics"]
-        self.posts = self.db["posts"]
-        self.likes = self.db["likes"]
-        self.comments = self.db["comments"]
+        self.posts = self.schema.collection(self.db, "posts")
+        self.likes = self.schema.collection(self.db, "likes")
+        self.comments = self.schema.collection(self.db, "comments")
+        self.user_stats = UserStatsRollup(self.db, self.schema)
+        
+        # Route each query by its consistency class
+        unknown_queries = set(consistency or {}) - set(DEFAULT_CONSISTENCY)
+        if unknown_queries:
+            raise ValueError(f"Unknown queries in consistency: {', '.join(sorted(unknown_queries))}")
+        self.consistency = dict(DEFAULT_CONSISTENCY)
+        self.consistency.update(consistency or {})
+        for query, consistency_class in self.consistency.items():
+            if consistency_class not in CONSISTENCY_CLASSES:
+                raise ValueError(f"Unknown consistency class {consistency_class!r} for {query}")
+        # The server rejects smaller bounds, but only once a read selects a server
+        if max_staleness_seconds < MIN_MAX_STALENESS_SECONDS:
+            raise ValueError(f"max_staleness_seconds must be at least {MIN_MAX_STALENESS_SECONDS}")
+        
+        read_preferences = {
+            "strong": Primary(),
+            "bounded": SecondaryPreferred(max_staleness=max_staleness_seconds),
+            "eventual": SecondaryPreferred()
+        }
+        self._read_collections = {
+            consistency_class: {
+                name: collection.with_options(read_preference=read_preference)
+                for name, collection in (("users", self.users), ("friendships", self.friendships),
+                                         ("topics", self.topics), ("posts", self.posts),
+                                         ("comments", self.comments),
+                                         ("user_stats", self.user_stats.user_stats))
+            }
+            for consistency_class, read_preference in read_preferences.items()
+        }
     
-    def get_all_posts_by_user(self, user_id):
+    def _read(self, query, name):
+        """Collection handle routed by the consistency class of a query"""
+        return self._read_collections[self.consistency[query]][name]
+    
+    def start_session(self):
+        """
+        Start a causally consistent session. Reads passed the session see the
+        session's earlier writes even when served by a secondary, e.g. a
+        feed read right after posting.
+        """
+        return self.client.start_session(causal_consistency=True)
+    
+    def _find_by_ids(self, collection, ids, projection, session=None):
+        """
+        Fetch documents by _id in a single round trip
+        :return: Dict of _id -> decoded document
+        """
+        ids = list(set(ids))
+        if not ids:
+            return {}
+        docs = collection.find({"_id": {"$in": ids}}, self.schema.fields(projection), session=session)
+        return {doc["_id"]: self.schema.decode(doc) for doc in docs}
+    
+    def get_all_posts_by_user(self, user_id, session=None):
         """
         Query 1: Get all posts of a user
         :param user_id: ObjectId of the user
+        :param session: Optional session from start_session() for read-your-writes
         :return: List of posts
         """
-        user_posts = list(self.posts.find(
-            {"userId": ObjectId(user_id) if isinstance(user_id, str) else user_id},
-            {"_id": 1, "content": 1, "createdAt": 1, "likeCount": 1, "commentCount": 1}
-        ).sort("createdAt", -1))
+        posts = self._read("get_all_posts_by_user", "posts")
+        s = self.schema
+        user_posts = list(posts.find(
+            {s.f("userId"): ObjectId(user_id) if isinstance(user_id, str) else user_id},
+            s.fields({"_id": 1, "content": 1, "createdAt": 1, "likeCount": 1, "commentCount": 1}),
+            session=session
+        ).sort(s.f("createdAt"), -1))
         
-        return user_posts
+        return s.decode_all(user_posts)
     
-    def get_top_k_most_liked_posts_by_user(self, user_id, k=10):
+    def get_top_k_most_liked_posts_by_user(self, user_id, k=10, session=None):
         """
         Query 2: Get top k most liked posts of a user
         :param user_id: ObjectId of the user
         :param k: Number of posts to return
+        :param session: Optional session from start_session() for read-your-writes
         :return: List of top k most liked posts
         """
-        top_liked_posts = list(self.posts.find(
-            {"userId": ObjectId(user_id) if isinstance(user_id, str) else user_id},
-            {"_id": 1, "content": 1, "createdAt": 1, "likeCount": 1}
-        ).sort("likeCount", -1).limit(k))
+        posts = self._read("get_top_k_most_liked_posts_by_user", "posts")
+        s = self.schema
+        top_liked_posts = list(posts.find(
+            {s.f("userId"): ObjectId(user_id) if isinstance(user_id, str) else user_id},
+            s.fields({"_id": 1, "content": 1, "createdAt": 1, "likeCount": 1}),
+            session=session
+        ).sort(s.f("likeCount"), -1).limit(k))
         
-        return top_liked_posts
+        return s.decode_all(top_liked_posts)
     
-    def get_top_k_most_commented_posts_by_user(self, user_id, k=10):
+    def get_top_k_most_commented_posts_by_user(self, user_id, k=10, session=None):
         """
         Query 3: Get top k most commented posts of a user
         :param user_id: ObjectId of the user
         :param k: Number of posts to return
+        :param session: Optional session from start_session() for read-your-writes
         :return: List of top k most commented posts
         """
-        top_commented_posts = list(self.posts.find(
-            {"userId": ObjectId(user_id) if isinstance(user_id, str) else user_id},
-            {"_id": 1, "content": 1, "createdAt": 1, "commentCount": 1}
-        ).sort("commentCount", -1).limit(k))
+        posts = self._read("get_top_k_most_commented_posts_by_user", "posts")
+        s = self.schema
+        top_commented_posts = list(posts.find(
+            {s.f("userId"): ObjectId(user_id) if isinstance(user_id, str) else user_id},
+            s.fields({"_id": 1, "content": 1, "createdAt": 1, "commentCount": 1}),
+            session=session
+        ).sort(s.f("commentCount"), -1).limit(k))
         
-        return top_commented_posts
+        return s.decode_all(top_commented_posts)
     
-    def get_all_comments_by_user(self, user_id):
+    def get_all_comments_by_user(self, user_id, session=None):
         """
         Query 4: Get all comments of a user
         :param user_id: ObjectId of the user
+        :param session: Optional session from start_session() for read-your-writes
         :return: List of comments with post information
         """
+        comments = self._read("get_all_comments_by_user", "comments")
+        posts = self._read("get_all_comments_by_user", "posts")
+        s = self.schema
         # Find all comments by the user
-        user_comments = list(self.comments.find(
-            {"userId": ObjectId(user_id) if isinstance(user_id, str) else user_id},
-            {"_id": 1, "postId": 1, "content": 1, "createdAt": 1}
-        ).sort("createdAt", -1))
+        user_comments = s.decode_all(list(comments.find(
+            {s.f("userId"): ObjectId(user_id) if isinstance(user_id, str) else user_id},
+            s.fields({"_id": 1, "postId": 1, "content": 1, "createdAt": 1}),
+            session=session
+        ).sort(s.f("createdAt"), -1)))
         
         # Enhance comments with post information
+        comment_posts = self._find_by_ids(posts, [comment["postId"] for comment in user_comments],
+                                          {"content": 1, "userId": 1}, session)
         for comment in user_comments:
-            post = self.posts.find_one({"_id": comment["postId"]}, {"content": 1, "userId": 1})
+            post = comment_posts.get(comment["postId"])
             if post:
                 comment["postContent"] = post["content"][:50] + "..." if len(post["content"]) > 50 else post["content"]
                 comment["postAuthorId"] = post["userId"]
         
         return user_comments
     
-    def get_all_posts_on_topic(self, topic_id):
+    def get_all_posts_on_topic(self, topic_id, session=None):
         """
         Query 5: Get all posts on a topic
         :param topic_id: ObjectId of the topic
+        :param session: Optional session from start_session() for read-your-writes
         :return: List of posts on the topic
         """
-        topic_posts = list(self.posts.find(
-            {"topicId": ObjectId(topic_id) if isinstance(topic_id, str) else topic_id},
-            {"_id": 1, "userId": 1, "content": 1, "createdAt": 1, "likeCount": 1, "commentCount": 1}
-        ).sort("createdAt", -1))
+        posts = self._read("get_all_posts_on_topic", "posts")
+        users = self._read("get_all_posts_on_topic", "users")
+        s = self.schema
+        topic_posts = s.decode_all(list(posts.find(
+            {s.f("topicId"): ObjectId(topic_id) if isinstance(topic_id, str) else topic_id},
+            s.fields({"_id": 1, "userId": 1, "content": 1, "createdAt": 1, "likeCount": 1, "commentCount": 1}),
+            session=session
+        ).sort(s.f("createdAt"), -1)))
         
         # Enhance posts with user information
+        authors = self._find_by_ids(users, [post["userId"] for post in topic_posts], {"username": 1}, session)
         for post in topic_posts:
-            user = self.users.find_one({"_id": post["userId"]}, {"username": 1})
+            user = authors.get(post["userId"])
             if user:
                 post["username"] = user["username"]
         
         return topic_posts
     
-    def get_top_k_popular_topics(self, k=10):
+    def get_top_k_popular_topics(self, k=10, session=None):
         """
         Query 6: Get top k most popular topics in terms of posts
         :param k: Number of topics to return
+        :param session: Optional session from start_session() for read-your-writes
         :return: List of top k popular topics
         """
-        top_topics = list(self.topics.find(
+        topics = self._read("get_top_k_popular_topics", "topics")
+        top_topics = list(topics.find(
             {},
-            {"_id": 1, "name": 1, "postCount": 1}
+            {"_id": 1, "name": 1, "postCount": 1},
+            session=session
         ).sort("postCount", -1).limit(k))
         
         return top_topics
     
-    def get_friend_posts_last_24_hours(self, user_id):
+    def get_friend_posts_last_24_hours(self, user_id, session=None):
         """
         Query 7: Get posts of all friends in last 24 hours
         :param user_id: ObjectId of the user
+        :param session: Optional session from start_session() for read-your-writes
         :return: List of posts by friends in the last 24 hours
         """
+        friendships = self._read("get_friend_posts_last_24_hours", "friendships")
+        posts = self._read("get_friend_posts_last_24_hours", "posts")
+        users = self._read("get_friend_posts_last_24_hours", "users")
+        topics = self._read("get_friend_posts_last_24_hours", "topics")
+        s = self.schema
         # Find all friends of the user
-        friends = list(self.friendships.find(
-            {"userId": ObjectId(user_id) if isinstance(user_id, str) else user_id},
-            {"friendId": 1}
+        friends = list(friendships.find(
+            {s.f("userId"): ObjectId(user_id) if isinstance(user_id, str) else user_id},
+            {s.f("friendId"): 1},
+            session=session
         ))
         
-        friend_ids = [friend["friendId"] for friend in friends]
+        friend_ids = [friend[s.f("friendId")] for friend in friends]
+        
+        # Celebrities' posts come from the cache, only the other friends hit the posts shards
+        cached_posts = []
+        if self.celebrity_cache is not None:
+            celebrity_ids, friend_ids = self.celebrity_cache.split_celebrities(friend_ids)
+            cached_posts = self.celebrity_cache.get_recent_posts(celebrity_ids)
         
         # Find recent posts by these friends
         last_24_hours = datetime.now() - timedelta(hours=24)
         
-        recent_friend_posts = list(self.posts.find(
+        recent_friend_posts = s.decode_all(list(posts.find(
             {
-                "userId": {"$in": friend_ids},
-                "createdAt": {"$gte": last_24_hours}
+                s.f("userId"): {"$in": friend_ids},
+                s.f("createdAt"): {"$gte": last_24_hours}
             },
-            {
+            s.fields({
                 "_id": 1, "userId": 1, "content": 1, "createdAt": 1, 
                 "likeCount": 1, "commentCount": 1, "topicId": 1
-            }
-        ).sort("createdAt", -1))
+            }),
+            session=session
+        ).sort(s.f("createdAt"), -1))) if friend_ids else []
         
         # Enhance posts with user and topic information
+        authors = self._find_by_ids(users, [post["userId"] for post in recent_friend_posts], {"username": 1}, session)
+        post_topics = self._find_by_ids(topics, [post["topicId"] for post in recent_friend_posts], {"name": 1}, session)
         for post in recent_friend_posts:
-            user = self.users.find_one({"_id": post["userId"]}, {"username": 1})
+            user = authors.get(post["userId"])
             if user:
                 post["username"] = user["username"]
             
-            topic = self.topics.find_one({"_id": post["topicId"]}, {"name": 1})
+            topic = post_topics.get(post["topicId"])
             if topic:
                 post["topicName"] = topic["name"]
         
+        if cached_posts:
+            recent_friend_posts = sorted(recent_friend_posts + cached_posts,
+                                         key=lambda post: post["createdAt"], reverse=True)
+        
         return recent_friend_posts
+    
+    def get_user_stats(self, user_id, session=None):
+        """
+        Query 8: Get post count, likes received, comments received and comment count of a user
+        :param user_id: ObjectId of the user
+        :param session: Optional session from start_session() for read-your-writes
+        :return: Stats document of the user
+        """
+        return self.user_stats.get(user_id, self._read("get_user_stats", "user_stats"), session)
+    
+    def _load_topic_posts(self, topic_id, session=None):
+        """Load all posts of a topic with usernames, for the in-process search index"""
+        s = self.schema
+        posts = s.decode_all(list(self._read("search_posts_on_topic", "posts").find(
+            {s.f("topicId"): topic_id}, s.fields(SEARCH_POST_FIELDS), session=session
+        )))
+        authors = self._find_by_ids(self._read("search_posts_on_topic", "users"),
+                                    [post["userId"] for post in posts], {"username": 1}, session)
+        for post in posts:
+            user = authors.get(post["userId"])
+            if user:
+                post["username"] = user["username"]
+        return posts
+    
+    def search_posts_on_topic(self, topic_id, text, k=10, after=None, session=None):
+        """
+        Query 9: Full-text search of the posts on a topic, ranked by relevance
+        :param topic_id: ObjectId of the topic
+        :param text: Search terms (phrases in quotes and -negation are supported by the server index)
+        :param k: Number of posts to return
+        :param after: nextCursor of the previous page, None for the first page;
+                      ValueError if it is malformed or its source is not available to this instance
+        :param session: Optional session from start_session() for read-your-writes
+        :return: Dict with the matching posts (best first, with a score) and the nextCursor
+        """
+        s = self.schema
+        topic_id = ObjectId(topic_id) if isinstance(topic_id, str) else topic_id
+        
+        # Hot topics are answered from the in-process index; a cursor keeps
+        # paginating in the index that produced its first page, as the two
+        # score on different scales
+        if after is not None and after.get("source") not in ("server", "cache"):
+            raise ValueError(f"Unknown search cursor source {after.get('source')!r}")
+        if after is not None and ("score" not in after or "_id" not in after):
+            raise ValueError("Search cursor is missing its score or _id")
+        if after is not None and after["source"] == "cache" and (self.search_cache is None or not is_simple_search(text)):
+            raise ValueError("Search cursor of the in-process index cannot be continued without it; "
+                             "restart the search with after=None")
+        
+        index = None
+        if self.search_cache is not None and is_simple_search(text) and (after is None or after["source"] == "cache"):
+            index = self.search_cache.get(topic_id, lambda: self._load_topic_posts(topic_id, session),
+                                          require=after is not None)
+        
+        if index is not None:
+            source = "cache"
+            posts = index.search(text, k, (after["score"], after["_id"]) if after else None)
+        else:
+            source = "server"
+            pipeline = [
+                {"$match": {s.f("topicId"): topic_id, "$text": {"$search": text}}},
+                {"$addFields": {"score": {"$meta": "textScore"}}}
+            ]
+            if after is not None:
+                pipeline.append({"$match": {"$or": [
+                    {"score": {"$lt": after["score"]}},
+                    {"score": after["score"], "_id": {"$lt": after["_id"]}}
+                ]}})
+            pipeline += [
+                {"$sort": {"score": -1, "_id": -1}},
+                {"$limit": k},
+                {"$project": dict(s.fields(SEARCH_POST_FIELDS), score=1)}
+            ]
+            posts = s.decode_all(list(self._read("search_posts_on_topic", "posts").aggregate(pipeline, session=session)))
+            
+            # Enhance posts with user information
+            authors = self._find_by_ids(self._read("search_posts_on_topic", "users"),
+                                        [post["userId"] for post in posts], {"username": 1}, session)
+            for post in posts:
+                user = authors.get(post["userId"])
+                if user:
+                    post["username"] = user["username"]
+        
+        next_cursor = None
+        if len(posts) == k:
+            next_cursor = {"source": source, "score": posts[-1]["score"], "_id": posts[-1]["_id"]}
+        
+        return {"posts": posts, "nextCursor": next_cursor}
 
 # Example usage
 if __name__ == "__main__":
@@ -167,4 +399,6 @@ if __name__ == "__main__":
     print("4. User comments:", queries.get_all_comments_by_user(sample_user_id))
     print("5. Topic posts:", queries.get_all_posts_on_topic(sample_topic_id))
     print("6. Popular topics:", queries.get_top_k_popular_topics(5))
-    print("7. Friend recent posts:", queries.get_friend_posts_last_24_hours(sample_user_id))
\ No newline at end of file
+    print("7. Friend recent posts:", queries.get_friend_posts_last_24_hours(sample_user_id))
+    print("8. User stats:", queries.get_user_stats(sample_user_id))
+    print("9. Topic search:", queries.search_posts_on_topic(sample_topic_id, "hello", 5))
\ No newline at end of file
@@ -0,0 +1,260 @@
+from pymongo import MongoClient, UpdateOne
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+import argparse
+import threading
+import time
+
+from user_stats import UserStatsRollup, split_id_range, id_range_filter
+from schema import Schema
+
+
+class _Throttle:
+    def __init__(self, max_docs_per_second=None):
+        """Shared rate limiter for all reconciliation workers"""
+        self.max_docs_per_second = max_docs_per_second
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Start counting from now, e.g. at the start of a run"""
+        with self.lock:
+            self.count = 0
+            self.ready_at = time.monotonic()
+
+    def wait(self, num_docs):
+        """Block until num_docs more documents may be scanned"""
+        if not self.max_docs_per_second:
+            return
+        with self.lock:
+            self.count += num_docs
+            now = time.monotonic()
+            # Time spent idle or below the limit is not saved up as credit
+            # for a later burst; at most one document ahead is allowed
+            self.ready_at = max(self.ready_at, now - 1 / self.max_docs_per_second)
+            self.ready_at += num_docs / self.max_docs_per_second
+            ready_at = self.ready_at
+        delay = ready_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class CounterReconciler:
+    def __init__(self, db, num_workers=4, batch_size=1000,
+                 max_docs_per_second=None, dry_run=False, schema=None):
+        """
+        Detect and repair drift in the denormalized counters
+        (posts.likeCount, posts.commentCount and topics.postCount).
+        :param db: pymongo Database holding the social network collections
+        :param num_workers: Number of posts _id ranges reconciled concurrently
+        :param batch_size: Number of posts recounted per aggregation round trip
+        :param max_docs_per_second: Rate limit across all workers on the posts, likes,
+                                    comments and topics scanned, None for unlimited
+        :param dry_run: Only report mismatches, do not write fixes
+        :param schema: Schema of the posts, likes and comments collections, v1 if None
+        """
+        self.db = db
+        self.schema = schema or Schema()
+        self.posts = self.schema.collection(db, "posts")
+        self.topics = db["topics"]
+        self.likes = self.schema.collection(db, "likes")
+        self.comments = self.schema.collection(db, "comments")
+
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.throttle = _Throttle(max_docs_per_second)
+
+    def _count_by_post(self, collection, post_ids):
+        """Count likes or comments per post for a batch of post ids"""
+        post_id_field = self.schema.f("postId")
+        counts = collection.aggregate([
+            {"$match": {post_id_field: {"$in": post_ids}}},
+            {"$group": {"_id": "$" + post_id_field, "count": {"$sum": 1}}}
+        ])
+        return {row["_id"]: row["count"] for row in counts}
+
+    def _reconcile_posts(self, batch, stats):
+        """Recount likes and comments of a batch of posts and fix mismatches"""
+        self.throttle.wait(len(batch))
+        post_ids = [post["_id"] for post in batch]
+        like_counts = self._count_by_post(self.likes, post_ids)
+        comment_counts = self._count_by_post(self.comments, post_ids)
+
+        # The likes and comments counted are only known afterwards, so they are
+        # charged to the throttle once counted and delay the next batch
+        num_likes, num_comments = sum(like_counts.values()), sum(comment_counts.values())
+        self.throttle.wait(num_likes + num_comments)
+
+        stats["postsScanned"] += len(batch)
+        stats["likesScanned"] += num_likes
+        stats["commentsScanned"] += num_comments
+
+        s = self.schema
+        updates = []
+        for post in batch:
+            for field, counts, mismatch_key in (
+                ("likeCount", like_counts, "likeCountMismatches"),
+                ("commentCount", comment_counts, "commentCountMismatches")
+            ):
+                stored_field = s.f(field)
+                stored = post.get(stored_field, 0)
+                actual = counts.get(post["_id"], 0)
+                if stored != actual:
+                    stats[mismatch_key] += 1
+                    # Only overwrite the value we read, so a concurrent $inc
+                    # is not lost; that post is picked up by the next run
+                    updates.append(UpdateOne(
+                        {"_id": post["_id"], stored_field: post.get(stored_field)},
+                        {"$set": {stored_field: actual}}
+                    ))
+
+        if updates and not self.dry_run:
+            result = self.posts.bulk_write(updates, ordered=False)
+            stats["fixed"] += result.modified_count
+
+    def _reconcile_range(self, lower, upper):
+        """Reconcile the posts whose _id falls in [lower, upper)"""
+        stats = Counter()
+
+        cursor = self.posts.find(
+            id_range_filter("_id", lower, upper),
+            self.schema.fields({"_id": 1, "likeCount": 1, "commentCount": 1})
+        ).sort("_id", 1).batch_size(self.batch_size)
+
+        batch = []
+        for post in cursor:
+            batch.append(post)
+            if len(batch) == self.batch_size:
+                self._reconcile_posts(batch, stats)
+                batch = []
+        if batch:
+            self._reconcile_posts(batch, stats)
+
+        return stats
+
+    def _reconcile_topic_batch(self, topics, stats):
+        """Recount the posts of a batch of topics and fix mismatched postCounts"""
+        # The stored values were read before recounting. A post created in
+        # between is counted while its $inc may be missing from the stored
+        # value; the $inc then either makes the conditional update fail or
+        # lands on top of the recount, and the next run repairs it. Nothing
+        # that is in the stored value is overwritten by an older count.
+        topic_field = self.schema.f("topicId")
+        counts = self.posts.aggregate([
+            {"$match": {topic_field: {"$in": [topic["_id"] for topic in topics]}}},
+            {"$group": {"_id": "$" + topic_field, "count": {"$sum": 1}}}
+        ])
+        post_counts = {row["_id"]: row["count"] for row in counts}
+        self.throttle.wait(len(topics) + sum(post_counts.values()))
+
+        stats["topicsScanned"] += len(topics)
+        stats["topicPostsCounted"] += sum(post_counts.values())
+
+        updates = []
+        for topic in topics:
+            actual = post_counts.get(topic["_id"], 0)
+            if topic.get("postCount", 0) != actual:
+                stats["topicPostCountMismatches"] += 1
+                updates.append(UpdateOne(
+                    {"_id": topic["_id"], "postCount": topic.get("postCount")},
+                    {"$set": {"postCount": actual}}
+                ))
+
+        if updates and not self.dry_run:
+            result = self.topics.bulk_write(updates, ordered=False)
+            stats["fixed"] += result.modified_count
+
+    def _reconcile_topics(self, stats):
+        """Compare topics.postCount with a recount of the posts on each topic"""
+        batch = []
+        for topic in self.topics.find({}, {"_id": 1, "postCount": 1}).batch_size(self.batch_size):
+            batch.append(topic)
+            if len(batch) == self.batch_size:
+                self._reconcile_topic_batch(batch, stats)
+                batch = []
+        if batch:
+            self._reconcile_topic_batch(batch, stats)
+
+    def run(self):
+        """
+        Recompute all counters, diff them against the stored values and fix mismatches
+        :return: Report with scan counts, mismatches, fixes and throughput
+        """
+        start_time = time.monotonic()
+        self.throttle.reset()
+        stats = Counter()
+
+        ranges = split_id_range(self.posts, self.num_workers)
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            futures = [executor.submit(self._reconcile_range, lower, upper) for lower, upper in ranges]
+            for future in futures:
+                stats.update(future.result())
+
+        self._reconcile_topics(stats)
+
+        elapsed = time.monotonic() - start_time
+        docs_scanned = (stats["postsScanned"] + stats["likesScanned"]
+                        + stats["commentsScanned"] + stats["topicsScanned"]
+                        + stats["topicPostsCounted"])
+
+        report = {
+            "dryRun": self.dry_run,
+            "postsScanned": stats["postsScanned"],
+            "likesScanned": stats["likesScanned"],
+            "commentsScanned": stats["commentsScanned"],
+            "topicsScanned": stats["topicsScanned"],
+            "topicPostsCounted": stats["topicPostsCounted"],
+            "docsScanned": docs_scanned,
+            "likeCountMismatches": stats["likeCountMismatches"],
+            "commentCountMismatches": stats["commentCountMismatches"],
+            "topicPostCountMismatches": stats["topicPostCountMismatches"],
+            "fixed": stats["fixed"],
+            "elapsedSeconds": elapsed,
+            "docsPerSecond": docs_scanned / elapsed if elapsed > 0 else 0.0
+        }
+        return report
+
+
+# Reconcile counters of an existing dataset
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect and repair drifted like/comment/post counters")
+    parser.add_argument("--connection-string", default="mongodb://localhost:27017/")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-docs-per-second", type=float, default=None)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--compact-schema", action="store_true",
+                        help="Reconcile the compact schema v2 collections")
+    parser.add_argument("--rebuild-user-stats", action="store_true",
+                        help="Rebuild user_stats from the repaired counters afterwards")
+    args = parser.parse_args()
+
+    client = MongoClient(args.connection_string)
+    db = client["social_network"]
+    schema = Schema(args.compact_schema)
+
+    reconciler = CounterReconciler(
+        db,
+        num_workers=args.workers,
+        batch_size=args.batch_size,
+        max_docs_per_second=args.max_docs_per_second,
+        dry_run=args.dry_run,
+        schema=schema
+    )
+    report = reconciler.run()
+
+    print("Counter reconciliation" + (" (dry run)" if report["dryRun"] else ""))
+    print(f"Scanned {report['postsScanned']} posts, {report['likesScanned']} likes, "
+          f"{report['commentsScanned']} comments, {report['topicsScanned']} topics "
+          f"(recounting {report['topicPostsCounted']} posts)")
+    print(f"likeCount mismatches: {report['likeCountMismatches']}")
+    print(f"commentCount mismatches: {report['commentCountMismatches']}")
+    print(f"topic postCount mismatches: {report['topicPostCountMismatches']}")
+    print(f"Fixed: {report['fixed']}")
+    print(f"Throughput: {report['docsPerSecond']:.0f} documents scanned/second "
+          f"({report['elapsedSeconds']:.2f} seconds)")
+
+    if args.rebuild_user_stats and not args.dry_run:
+        count = UserStatsRollup(db, schema).rebuild(num_workers=args.workers)
+        print(f"Rebuilt stats for {count} users")
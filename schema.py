@@ -0,0 +1,97 @@
+# Stored field names of the compact (v2) schema. Only the high-volume
+# collections are compacted; users, topics and user_stats keep v1 names.
+COMPACT_FIELDS = {
+    "userId": "u",
+    "friendId": "f",
+    "postId": "p",
+    "topicId": "t",
+    "content": "x",
+    "createdAt": "c",
+    "likeCount": "lc",
+    "commentCount": "cc"
+}
+
+COMPACT_COLLECTIONS = ("friendships", "posts", "likes", "comments")
+
+# Secondary indexes of the social network collections, in v1 field names
+# (mirrors mongo_script.sh); an index with options is a (keys, options) tuple
+INDEXES = {
+    "posts": [
+        [("userId", 1), ("createdAt", -1)],
+        [("userId", 1), ("likeCount", -1)],
+        [("userId", 1), ("commentCount", -1)],
+        [("topicId", 1), ("createdAt", -1)],
+        [("topicId", 1), ("content", "text")],
+        [("likeCount", -1)],
+        [("commentCount", -1)]
+    ],
+    "comments": [
+        [("postId", 1)],
+        [("userId", 1), ("createdAt", -1)]
+    ],
+    "likes": [
+        [("postId", 1)],
+        ([("postId", 1), ("userId", 1)], {"unique": True})
+    ],
+    "friendships": [
+        [("userId", 1)],
+        [("friendId", 1)]
+    ],
+    "topics": [
+        [("postCount", -1)]
+    ]
+}
+
+
+def index_specs(name):
+    """
+    The secondary indexes of a collection
+    :param name: v1 collection name
+    :return: List of (keys, options) in v1 field names
+    """
+    return [index if isinstance(index, tuple) else (index, {}) for index in INDEXES.get(name, [])]
+
+
+# Compact documents live in separate collections so they can be sharded
+# on the short keys and migrated online next to the v1 data
+COMPACT_SUFFIX = "_v2"
+
+
+class Schema:
+    def __init__(self, compact=False):
+        """
+        Maps the field names used by the application to the stored ones.
+        With compact=False (schema v1) every mapping is the identity.
+        :param compact: Use the compact schema v2
+        """
+        self.compact = compact
+        self.stored_names = dict(COMPACT_FIELDS) if compact else {}
+        self.field_names = {stored: name for name, stored in self.stored_names.items()}
+
+    def collection(self, db, name):
+        """Get the collection holding documents of the given v1 collection name"""
+        if self.compact and name in COMPACT_COLLECTIONS:
+            return db[name + COMPACT_SUFFIX]
+        return db[name]
+
+    def f(self, name):
+        """Stored name of a field"""
+        return self.stored_names.get(name, name)
+
+    def fields(self, doc):
+        """Rename the top-level keys of a filter, projection or document to stored names"""
+        if not self.compact:
+            return doc
+        return {self.stored_names.get(key, key): value for key, value in doc.items()}
+
+    def decode(self, doc):
+        """Rename the top-level keys of a stored document back to field names"""
+        if not self.compact or doc is None:
+            return doc
+        return {self.field_names.get(key, key): value for key, value in doc.items()}
+
+    def decode_all(self, docs):
+        """Decode a list of stored documents"""
+        if not self.compact:
+            return docs
+        return [self.decode(doc) for doc in docs]
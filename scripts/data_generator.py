@@ -3,10 +3,19 @@ from bson.objectid import ObjectId
 from datetime import datetime, timedelta
 import random
 import string
+import sys
+import os
+
+# Add parent directory to path so we can import the snapshot and user_stats modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshot import export_snapshot, DEFAULT_SNAPSHOT_PATH
+from user_stats import UserStatsRollup
 
 # MongoDB connection
 client = MongoClient('mongodb://localhost:27017/')
 db = client['social_network']
+user_stats = UserStatsRollup(db)
 
 # Clear existing collections
 db.users.delete_many({})
@@ -15,6 +24,7 @@ db.topics.delete_many({})
 db.posts.delete_many({})
 db.likes.delete_many({})
 db.comments.delete_many({})
+db.user_stats.delete_many({})
 
 # Configuration
 NUM_USERS = 100
@@ -69,6 +79,7 @@ for user_id in user_ids:
 
 # Generate posts
 post_ids = []
+post_authors = {}
 print("Creating posts...")
 for user_id in user_ids:
     num_posts = random.randint(1, MAX_POSTS_PER_USER)
@@ -86,12 +97,16 @@ for user_id in user_ids:
             "commentCount": 0
         })
         post_ids.append(result.inserted_id)
+        post_authors[result.inserted_id] = user_id
         
         # Update topic post count
         db.topics.update_one(
             {"_id": topic_id},
             {"$inc": {"postCount": 1}}
         )
+        
+        # Update author stats
+        user_stats.record_post(user_id)
 
 # Generate likes
 print("Creating likes...")
@@ -111,6 +126,9 @@ for post_id in post_ids:
             {"_id": post_id},
             {"$inc": {"likeCount": 1}}
         )
+        
+        # Update post author stats
+        user_stats.record_like(post_authors[post_id])
 
 # Generate comments
 print("Creating comments...")
@@ -132,12 +150,18 @@ for post_id in post_ids:
             {"_id": post_id},
             {"$inc": {"commentCount": 1}}
         )
+        
+        # Update commenter and post author stats
+        user_stats.record_comment(user_id, post_authors[post_id])
 
 print("Data generation complete!")
 print(f"Created {len(user_ids)} users, {len(topic_ids)} topics, {len(post_ids)} posts")
 
-# Save a sample user ID to a file for testing
-with open("sample_ids.txt", "w") as f:
-    f.write(f"Sample User ID: {user_ids[0]}\n")
-    f.write(f"Sample Topic ID: {topic_ids[0]}\n")
-    f.write(f"Sample Post ID: {post_ids[0]}\n")
\ No newline at end of file
+# Save the dataset and sample IDs as a snapshot, so test and benchmark
+# runs can restore the same data instead of regenerating it
+export_snapshot(db, DEFAULT_SNAPSHOT_PATH, sample_ids={
+    "sample_user_id": user_ids[0],
+    "sample_topic_id": topic_ids[0],
+    "sample_post_id": post_ids[0]
+})
+print(f"Snapshot saved to {DEFAULT_SNAPSHOT_PATH}")
\ No newline at end of file
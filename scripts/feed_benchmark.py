@@ -0,0 +1,121 @@
+import sys
+import os
+import random
+import time
+from pymongo import MongoClient, monitoring
+from pymongo.errors import OperationFailure
+
+# Add parent directory to path so we can import the query modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_implementation import SocialNetworkQueries
+from celebrity_cache import CelebrityPostCache
+
+# Configuration
+NUM_FEEDS = 1000
+CELEBRITY_FRACTION = 0.05  # Most followed authors served from the cache
+
+
+class PostsReadCounter(monitoring.CommandListener):
+    """Counts the commands sent to the posts collection and the documents they return"""
+
+    def __init__(self):
+        self.commands = 0
+        self.documents = 0
+        self.pending = set()
+
+    def started(self, event):
+        if event.command_name == "find":
+            collection = event.command.get("find")
+        elif event.command_name == "getMore":
+            collection = event.command.get("collection")
+        else:
+            return
+        if collection in ("posts", "posts_v2"):
+            self.pending.add(event.request_id)
+
+    def succeeded(self, event):
+        if event.request_id in self.pending:
+            self.pending.discard(event.request_id)
+            cursor = event.reply.get("cursor", {})
+            self.commands += 1
+            self.documents += len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+
+    def failed(self, event):
+        self.pending.discard(event.request_id)
+
+
+def shard_clients(client):
+    """Direct connections to every shard's replica set, empty when not connected to a mongos"""
+    try:
+        shards = client.admin.command("listShards")["shards"]
+    except OperationFailure:
+        return {}
+    clients = {}
+    for shard in shards:
+        replica_set, hosts = shard["host"].split("/", 1)
+        clients[shard["_id"]] = MongoClient(f"mongodb://{hosts}/?replicaSet={replica_set}")
+    return clients
+
+
+def shard_documents_returned(clients):
+    """Documents returned by queries on each shard since it started"""
+    return {name: client.admin.command("serverStatus")["metrics"]["document"]["returned"]
+            for name, client in clients.items()}
+
+
+def benchmark(name, queries, user_ids, counter, shards):
+    """Run the friend feed of every user and print latency percentiles and posts load"""
+    counter.commands = counter.documents = 0
+    shard_before = shard_documents_returned(shards)
+
+    latencies = []
+    for user_id in user_ids:
+        start_time = time.perf_counter()
+        queries.get_friend_posts_last_24_hours(user_id)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<16} p50 {p50:8.3f} ms   p99 {p99:8.3f} ms   "
+          f"posts reads {counter.commands:6d}   posts documents {counter.documents:8d}")
+
+    shard_after = shard_documents_returned(shards)
+    for shard in sorted(shards):
+        print(f"{'':<16} {shard}: {shard_after[shard] - shard_before[shard]} documents returned")
+
+
+counter = PostsReadCounter()
+monitoring.register(counter)
+
+queries = SocialNetworkQueries()
+shards = shard_clients(queries.client)
+
+# Make the most followed authors celebrities
+follower_counts = sorted(
+    (row["followers"] for row in queries.friendships.aggregate([
+        {"$group": {"_id": "$friendId", "followers": {"$sum": 1}}}
+    ])),
+    reverse=True
+)
+num_celebrities = max(1, int(len(follower_counts) * CELEBRITY_FRACTION))
+threshold = follower_counts[num_celebrities - 1]
+
+celebrity_cache = CelebrityPostCache(follower_threshold=threshold)
+celebrity_cache.refresh_celebrities()
+cached_queries = SocialNetworkQueries(celebrity_cache=celebrity_cache)
+
+user_ids = [user["_id"] for user in queries.users.find({}, {"_id": 1})]
+feeds = [random.choice(user_ids) for _ in range(NUM_FEEDS)]
+
+print(f"Reading {NUM_FEEDS} friend feeds; {len(celebrity_cache.celebrities)} authors "
+      f"with {threshold}+ followers are cached")
+if not shards:
+    print("Not connected to a mongos; reporting client-side posts reads only")
+
+benchmark("without cache", queries, feeds, counter, shards)
+
+# Fill the cache before measuring
+celebrity_cache.get_recent_posts(list(celebrity_cache.celebrities))
+benchmark("with cache", cached_queries, feeds, counter, shards)
@@ -0,0 +1,53 @@
+import sys
+import os
+import random
+import time
+
+# Add parent directory to path so we can import the query modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_implementation import SocialNetworkQueries
+from post_search import HotTopicSearchCache, tokenize
+
+# Configuration
+NUM_SEARCHES = 200
+K = 10
+
+
+def scan_search(queries, topic_id, text, k):
+    """Current approach: fetch every post on the topic and filter in Python"""
+    terms = set(tokenize(text))
+    posts = queries.get_all_posts_on_topic(topic_id)
+    return [post for post in posts if terms & set(tokenize(post["content"]))][:k]
+
+
+def benchmark(name, search, terms):
+    """Run a search for every term and print latency percentiles"""
+    latencies = []
+    for text in terms:
+        start_time = time.perf_counter()
+        search(text)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+
+    latencies.sort()
+    mean = sum(latencies) / len(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<22} mean {mean:8.3f} ms   p50 {p50:8.3f} ms   p99 {p99:8.3f} ms")
+
+
+queries = SocialNetworkQueries()
+cached_queries = SocialNetworkQueries(search_cache=HotTopicSearchCache(hot_threshold=1))
+
+# Search the most popular topic for words taken from its own posts
+topic_id = queries.get_top_k_popular_topics(1)[0]["_id"]
+words = [word for post in queries.get_all_posts_on_topic(topic_id) for word in tokenize(post["content"]) if len(word) > 3]
+terms = [random.choice(words) for _ in range(NUM_SEARCHES)]
+
+print(f"Searching topic {topic_id} with {NUM_SEARCHES} single-term searches, k={K}")
+benchmark("scan (Query 5)", lambda text: scan_search(queries, topic_id, text, K), terms)
+benchmark("text index", lambda text: queries.search_posts_on_topic(topic_id, text, K), terms)
+
+# Build the hot topic index before measuring
+cached_queries.search_posts_on_topic(topic_id, terms[0], K)
+benchmark("in-process index", lambda text: cached_queries.search_posts_on_topic(topic_id, text, K), terms)
@@ -0,0 +1,60 @@
+import sys
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path so we can import the write module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from write_implementation import SocialNetworkWrites, MicroBatcher
+
+# Configuration
+NUM_THREADS = 16
+NUM_LIKES = 20000
+
+writes = SocialNetworkWrites()
+user_ids = [user["_id"] for user in writes.db.users.find({}, {"_id": 1})]
+post_ids = [post["_id"] for post in writes.posts.find({}, {"_id": 1}).limit(5000)]
+
+# Random likes, retried once each to exercise deduplication
+likes = [(random.choice(user_ids), random.choice(post_ids)) for _ in range(NUM_LIKES // 2)]
+likes = likes + likes
+random.shuffle(likes)
+
+
+def report(name, elapsed, new_likes):
+    print(f"{name:<28} {len(likes) / elapsed:10.0f} likes/second   {new_likes} new likes")
+
+
+print(f"Sending {len(likes)} likes from {NUM_THREADS} threads")
+
+# One like_post round trip per like
+likes_before = writes.likes.count_documents({})
+start_time = time.perf_counter()
+with ThreadPoolExecutor(max_workers=NUM_THREADS) as executor:
+    list(executor.map(lambda like: writes.like_post(*like), likes))
+report("single writes", time.perf_counter() - start_time, writes.likes.count_documents({}) - likes_before)
+
+# The same likes retried through the micro-batcher add nothing
+batcher = MicroBatcher(writes)
+likes_before = writes.likes.count_documents({})
+start_time = time.perf_counter()
+with ThreadPoolExecutor(max_workers=NUM_THREADS) as executor:
+    futures = list(executor.map(lambda like: batcher.like_post(*like), likes))
+    for future in futures:
+        future.result()
+report("micro-batched retries", time.perf_counter() - start_time, writes.likes.count_documents({}) - likes_before)
+
+# Fresh likes through the micro-batcher
+fresh_likes = [(random.choice(user_ids), random.choice(post_ids)) for _ in range(NUM_LIKES)]
+likes_before = writes.likes.count_documents({})
+start_time = time.perf_counter()
+with ThreadPoolExecutor(max_workers=NUM_THREADS) as executor:
+    futures = list(executor.map(lambda like: batcher.like_post(*like), fresh_likes))
+    for future in futures:
+        future.result()
+report("micro-batched writes", time.perf_counter() - start_time, writes.likes.count_documents({}) - likes_before)
+batcher.close()
+
+print("Run reconcile.py --dry-run to confirm the counters did not drift")
@@ -0,0 +1,239 @@
+from pymongo import MongoClient, IndexModel
+from pymongo.errors import OperationFailure
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+import argparse
+import gzip
+import os
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+SNAPSHOT_FORMAT = "social-network-snapshot"
+SNAPSHOT_VERSION = 1
+
+# Marker key of the header and section documents; stored documents never
+# have top-level $-prefixed fields, so it cannot clash with data
+MARKER = "$snapshot"
+
+# Documents are copied as undecoded BSON bytes in both directions
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+# The header and section documents are written with the marker as their first
+# field, a string; data documents are recognised without decoding them
+_MARKER_PREFIX = b"\x02" + MARKER.encode() + b"\x00"
+
+# Where initialization.py and scripts/data_generator.py save the generated dataset
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts", "social_network.snapshot.gz")
+
+
+def _open(path, mode, compress=False):
+    """Open a snapshot file, transparently handling gzip compression"""
+    if mode == "rb":
+        with open(path, "rb") as f:
+            compress = f.read(2) == b"\x1f\x8b"
+    if compress:
+        return gzip.open(path, mode, compresslevel=6)
+    return open(path, mode)
+
+
+def _sample_ids(db):
+    """Pick the first user, topic and post as sample ids"""
+    sample_ids = {}
+    for key, collection in (("sample_user_id", "users"),
+                            ("sample_topic_id", "topics"),
+                            ("sample_post_id", "posts")):
+        doc = db[collection].find_one({}, {"_id": 1}, sort=[("_id", 1)])
+        sample_ids[key] = doc["_id"] if doc else None
+    return sample_ids
+
+
+def export_snapshot(db, path, sample_ids=None, compress=True, batch_size=5000):
+    """
+    Dump every collection of the database, with its indexes, to a streamed BSON file.
+    The file is a sequence of BSON documents: a header holding the sample ids,
+    then for each collection a section header with its index specs followed
+    by its documents in _id order, copied as raw BSON without being decoded.
+    :param db: pymongo Database to export
+    :param path: Output file path
+    :param sample_ids: Dict of sample ids to store, picked from the data if None
+    :param compress: Gzip the output
+    :param batch_size: Cursor batch size used while reading collections
+    :return: Dict of collection name -> number of documents exported
+    """
+    if sample_ids is None:
+        sample_ids = _sample_ids(db)
+
+    counts = {}
+    with _open(path, "wb", compress) as f:
+        f.write(bson.encode({
+            MARKER: "header",
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "createdAt": datetime.now(),
+            "sampleIds": sample_ids
+        }))
+
+        for name in sorted(db.list_collection_names()):
+            if name.startswith("system."):
+                continue
+            indexes = [dict(index) for index in db[name].list_indexes() if index["name"] != "_id_"]
+            f.write(bson.encode({MARKER: "collection", "name": name, "indexes": indexes}))
+
+            collection = db.get_collection(name, codec_options=RAW_CODEC_OPTIONS)
+            count = 0
+            for raw in collection.find({}, sort=[("_id", 1)], batch_size=batch_size):
+                f.write(raw.raw)
+                count += 1
+            counts[name] = count
+
+    return counts
+
+
+def read_sample_ids(path):
+    """
+    Read the sample ids stored in a snapshot without loading its data
+    :param path: Snapshot file path
+    :return: Dict with sample_user_id, sample_topic_id and sample_post_id
+    """
+    with _open(path, "rb") as f:
+        header = next(bson.decode_file_iter(f))
+    if header.get(MARKER) != "header" or header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} is not a social network snapshot")
+    return header["sampleIds"]
+
+
+def _create_indexes(collection, indexes):
+    """Recreate exported index specs on a collection"""
+    models = []
+    for spec in indexes:
+        options = {k: v for k, v in spec.items() if k not in ("v", "key", "ns")}
+        keys = []
+        for field, direction in spec["key"].items():
+            # Text indexes are listed with internal _fts/_ftsx keys,
+            # the text fields themselves are in the weights option
+            if field == "_fts":
+                keys.extend((text_field, "text") for text_field in spec["weights"])
+            elif field != "_ftsx":
+                keys.append((field, direction))
+        models.append(IndexModel(keys, **options))
+    if models:
+        collection.create_indexes(models)
+
+
+def _recreate_collection(db, name):
+    """
+    Drop a collection and create it empty with the same options, re-sharding
+    it with its old shard key when the database is sharded
+    """
+    options = {}
+    for info in db.list_collections(filter={"name": name}):
+        options = info.get("options", {})
+
+    namespace = f"{db.name}.{name}"
+    sharding = None
+    try:
+        sharding = db.client["config"]["collections"].find_one({"_id": namespace, "dropped": {"$ne": True}})
+    except OperationFailure:
+        pass
+
+    db.drop_collection(name)
+    db.create_collection(name, **options)
+    if sharding is not None:
+        db.client.admin.command("shardCollection", namespace, key=sharding["key"],
+                                unique=sharding.get("unique", False))
+    return db[name]
+
+
+def restore_snapshot(db, path, num_workers=4, batch_size=5000):
+    """
+    Load a snapshot into the database, replacing the data of every collection it contains.
+    Each collection is dropped and recreated empty, which is much cheaper
+    than deleting its documents one by one; collection options and the shard
+    key of the existing collection are kept. Documents are inserted as raw
+    BSON, without being decoded, with unordered insert_many batches spread
+    over a thread pool, and secondary indexes are built once all data is in.
+    :param db: pymongo Database to restore into
+    :param path: Snapshot file path
+    :param num_workers: Number of concurrent insert batches
+    :param batch_size: Number of documents per insert_many
+    :return: Dict of sample ids stored in the snapshot
+    """
+    header = None
+    pending_indexes = {}
+    in_flight = set()
+
+    with _open(path, "rb") as f, ThreadPoolExecutor(max_workers=num_workers) as executor:
+
+        def submit(collection, docs):
+            # Bound the number of batches held in memory
+            nonlocal in_flight
+            if len(in_flight) >= num_workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            in_flight.add(executor.submit(collection.insert_many, docs, ordered=False))
+
+        collection = None
+        batch = []
+        for raw in bson.decode_file_iter(f, codec_options=RAW_CODEC_OPTIONS):
+            if raw.raw[4:4 + len(_MARKER_PREFIX)] != _MARKER_PREFIX:
+                batch.append(raw)
+                if len(batch) >= batch_size:
+                    submit(collection, batch)
+                    batch = []
+                continue
+
+            doc = bson.decode(raw.raw)
+            marker = doc.get(MARKER)
+            if marker == "header":
+                if doc.get("format") != SNAPSHOT_FORMAT:
+                    raise ValueError(f"{path} is not a social network snapshot")
+                header = doc
+            elif marker == "collection":
+                if batch:
+                    submit(collection, batch)
+                    batch = []
+                collection = _recreate_collection(db, doc["name"])
+                pending_indexes[doc["name"]] = doc["indexes"]
+
+        if batch:
+            submit(collection, batch)
+        for future in in_flight:
+            future.result()
+
+        # Build indexes after the load, one collection per worker
+        futures = [executor.submit(_create_indexes, db[name], indexes)
+                   for name, indexes in pending_indexes.items()]
+        for future in futures:
+            future.result()
+
+    if header is None:
+        raise ValueError(f"{path} is not a social network snapshot")
+    return header["sampleIds"]
+
+
+# Export or restore a snapshot of the social_network database
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or restore a social network dataset snapshot")
+    parser.add_argument("action", choices=["export", "restore"])
+    parser.add_argument("path", nargs="?", default=DEFAULT_SNAPSHOT_PATH)
+    parser.add_argument("--connection-string", default="mongodb://localhost:27017/")
+    parser.add_argument("--no-compress", action="store_true")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    client = MongoClient(args.connection_string)
+    db = client["social_network"]
+
+    if args.action == "export":
+        counts = export_snapshot(db, args.path, compress=not args.no_compress, batch_size=args.batch_size)
+        for name, count in counts.items():
+            print(f"Exported {count} documents from {name}")
+    else:
+        sample_ids = restore_snapshot(db, args.path, num_workers=args.workers, batch_size=args.batch_size)
+        print("Snapshot restored")
+        print(f"Sample user ID: {sample_ids['sample_user_id']}")
+        print(f"Sample topic ID: {sample_ids['sample_topic_id']}")
+        print(f"Sample post ID: {sample_ids['sample_post_id']}")
@@ -0,0 +1,299 @@
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+pymongo = pytest.importorskip("pymongo")
+from pymongo import MongoClient, monitoring
+from bson.objectid import ObjectId
+
+# Add parent directory to path so we can import the query modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema import INDEXES, index_specs
+
+DB_NAME = "social_network"
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Records the commands sent to the social_network database"""
+
+    def __init__(self):
+        self.commands = []
+        self.addresses = []
+
+    def reset(self):
+        self.commands = []
+        self.addresses = []
+
+    def started(self, event):
+        if event.database_name == DB_NAME:
+            self.commands.append(event.command_name)
+            self.addresses.append(event.connection_id)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# Registered before any client is created, so every client is monitored
+command_counter = CommandCounter()
+monitoring.register(command_counter)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mongod(dbpath, *args):
+    """
+    Start a throwaway mongod and wait until it accepts connections
+    :return: (process, port)
+    """
+    mongod = os.environ.get("MONGOD", shutil.which("mongod"))
+    if not mongod:
+        pytest.skip("mongod binary not found (set MONGOD to its path)")
+
+    port = _free_port()
+    process = subprocess.Popen(
+        [mongod, "--port", str(port), "--dbpath", str(dbpath), "--bind_ip", "127.0.0.1", *args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    client = MongoClient(f"mongodb://127.0.0.1:{port}/", directConnection=True, serverSelectionTimeoutMS=500)
+    deadline = time.time() + 30
+    while True:
+        try:
+            client.admin.command("ping")
+            break
+        except pymongo.errors.PyMongoError:
+            if process.poll() is not None or time.time() > deadline:
+                process.kill()
+                pytest.fail("mongod did not start")
+            time.sleep(0.2)
+    client.close()
+
+    return process, port
+
+
+def stop_mongod(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+@pytest.fixture(scope="session")
+def mongodb_uri(tmp_path_factory):
+    """Connection string of a throwaway standalone mongod"""
+    process, port = start_mongod(tmp_path_factory.mktemp("mongod"))
+    yield f"mongodb://127.0.0.1:{port}/"
+    stop_mongod(process)
+
+
+@pytest.fixture(scope="session")
+def scratch_mongodb_uri(tmp_path_factory):
+    """
+    Connection string of a second mongod for tests that write, so the shared
+    dataset stays as seeded. It runs as a single-member replica set, which
+    the transactions of the write API need.
+    """
+    process, port = start_mongod(tmp_path_factory.mktemp("scratch"), "--replSet", "scratch")
+
+    client = MongoClient(f"mongodb://127.0.0.1:{port}/", directConnection=True)
+    client.admin.command("replSetInitiate", {"_id": "scratch", "members": [
+        {"_id": 0, "host": f"127.0.0.1:{port}"}
+    ]})
+    deadline = time.time() + 60
+    while not client.admin.command("hello").get("isWritablePrimary"):
+        if time.time() > deadline:
+            pytest.fail("scratch replica set did not elect a primary")
+        time.sleep(0.5)
+    client.close()
+
+    yield f"mongodb://127.0.0.1:{port}/?replicaSet=scratch"
+    stop_mongod(process)
+
+
+@pytest.fixture
+def scratch_dataset(scratch_mongodb_uri):
+    """
+    Freshly seeded dataset on the scratch mongod, for a single test
+    :return: (social_network Database, dict of ids used by the tests)
+    """
+    client = MongoClient(scratch_mongodb_uri)
+    client.drop_database(DB_NAME)
+    db = client[DB_NAME]
+    yield db, seed_dataset(db)
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def replica_set(tmp_path_factory):
+    """
+    Throwaway two-member replica set with a fixed primary
+    :return: Dict with the connection string and the primary and secondary addresses
+    """
+    members = [start_mongod(tmp_path_factory.mktemp(f"rs{i}"), "--replSet", "rs0") for i in range(2)]
+    addresses = [("127.0.0.1", port) for _, port in members]
+
+    client = MongoClient(f"mongodb://127.0.0.1:{addresses[0][1]}/", directConnection=True)
+    client.admin.command("replSetInitiate", {"_id": "rs0", "members": [
+        {"_id": 0, "host": f"127.0.0.1:{addresses[0][1]}", "priority": 2},
+        {"_id": 1, "host": f"127.0.0.1:{addresses[1][1]}", "priority": 1}
+    ]})
+    deadline = time.time() + 60
+    while sorted(member["state"] for member in client.admin.command("replSetGetStatus")["members"]) != [1, 2]:
+        if time.time() > deadline:
+            pytest.fail("replica set did not elect a primary")
+        time.sleep(0.5)
+    client.close()
+
+    yield {
+        "uri": f"mongodb://127.0.0.1:{addresses[0][1]},127.0.0.1:{addresses[1][1]}/?replicaSet=rs0",
+        "primary": addresses[0],
+        "secondary": addresses[1]
+    }
+
+    for process, _ in members:
+        stop_mongod(process)
+
+
+@pytest.fixture(scope="session")
+def replica_set_dataset(replica_set):
+    """Fixed dataset seeded on the replica set, replicated to both members"""
+    client = MongoClient(replica_set["uri"], w=2)
+    dataset = seed_dataset(client[DB_NAME])
+    client.close()
+    return dataset
+
+
+def seed_dataset(db):
+    """
+    Seed a fixed dataset with a "light" and a "heavy" variant of every query
+    input, so query cost can be compared across result sizes. All result
+    sizes stay below the default first batch (101 documents) so a query's
+    round trips do not depend on cursor batching.
+    :return: Dict of ids used by the tests
+    """
+    rng = random.Random(42)
+    now = datetime.now()
+
+    for name in ("users", "friendships", "topics", "posts", "likes", "comments", "user_stats"):
+        db[name].drop()
+
+    users = [{"_id": ObjectId(), "username": f"user{i+1}", "email": f"user{i+1}@example.com",
+              "dateJoined": now - timedelta(days=100), "lastActive": now} for i in range(42)]
+    light_user, heavy_user, authors = users[0], users[1], users[2:]
+
+    topics = [{"_id": ObjectId(), "name": f"Topic{i+1}", "postCount": 0} for i in range(7)]
+    heavy_topic, light_topic, other_topics = topics[0], topics[1], topics[2:]
+
+    posts = []
+
+    def add_post(author, topic, created_at):
+        post = {
+            "_id": ObjectId(),
+            "userId": author["_id"],
+            "content": "".join(rng.choices("abcdefghij ", k=80)),
+            "topicId": topic["_id"],
+            "createdAt": created_at,
+            "likeCount": rng.randint(0, 50),
+            "commentCount": rng.randint(0, 20)
+        }
+        posts.append(post)
+        topic["postCount"] += 1
+        return post
+
+    # Every author has one old post on the heavy topic and one post in the last 24 hours
+    heavy_topic_posts = []
+    for i, author in enumerate(authors):
+        heavy_topic_posts.append(add_post(author, heavy_topic, now - timedelta(days=3)))
+        add_post(author, other_topics[i % len(other_topics)], now - timedelta(hours=rng.randint(1, 20)))
+
+    for _ in range(2):
+        add_post(authors[0], light_topic, now - timedelta(days=5))
+    for i in range(2):
+        add_post(light_user, other_topics[i], now - timedelta(days=10 + i))
+    for i in range(40):
+        add_post(heavy_user, other_topics[i % len(other_topics)], now - timedelta(days=10, minutes=i))
+
+    comments = []
+    for commenter, commented in ((light_user, heavy_topic_posts[:2]), (heavy_user, heavy_topic_posts)):
+        for i, post in enumerate(commented):
+            comments.append({
+                "userId": commenter["_id"],
+                "postId": post["_id"],
+                "content": "".join(rng.choices("abcdefghij ", k=30)),
+                "createdAt": now - timedelta(hours=30 + i)
+            })
+
+    friendships = [{"userId": light_user["_id"], "friendId": authors[0]["_id"], "createdAt": now}]
+    friendships += [{"userId": heavy_user["_id"], "friendId": author["_id"], "createdAt": now} for author in authors]
+
+    db.users.insert_many(users)
+    db.topics.insert_many(topics)
+    db.posts.insert_many(posts)
+    db.comments.insert_many(comments)
+    db.friendships.insert_many(friendships)
+
+    for name in INDEXES:
+        for keys, options in index_specs(name):
+            db[name].create_index(keys, **options)
+
+    return {
+        "light_user_id": light_user["_id"],
+        "heavy_user_id": heavy_user["_id"],
+        "light_topic_id": light_topic["_id"],
+        "heavy_topic_id": heavy_topic["_id"]
+    }
+
+
+@pytest.fixture(scope="session")
+def mongo_client(mongodb_uri):
+    client = MongoClient(mongodb_uri)
+    yield client
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def dataset(mongo_client):
+    return seed_dataset(mongo_client[DB_NAME])
+
+
+@pytest.fixture
+def measure(mongo_client):
+    """
+    Run a query and measure its cost
+    :return: Function returning (result, commands sent, documents examined)
+    """
+    db = mongo_client[DB_NAME]
+
+    def run(query, *args, **kwargs):
+        db.command("profile", 0)
+        db.system.profile.drop()
+        db.command("profile", 2)
+
+        command_counter.reset()
+        result = query(*args, **kwargs)
+        commands = list(command_counter.commands)
+
+        db.command("profile", 0)
+        docs_examined = sum(
+            entry.get("docsExamined", 0)
+            for entry in db.system.profile.find({"ns": {"$regex": rf"^{DB_NAME}\.(?!system\.|\$cmd)"}})
+        )
+        return result, commands, docs_examined
+
+    return run
@@ -0,0 +1,182 @@
+import threading
+import time
+
+import pytest
+from bson.objectid import ObjectId
+from datetime import datetime
+
+from celebrity_cache import CelebrityPostCache
+from query_implementation import SocialNetworkQueries
+from write_implementation import SocialNetworkWrites
+from conftest import command_counter
+
+# The light and the heavy user both follow the first author, every other author has one follower
+FOLLOWER_THRESHOLD = 2
+
+
+@pytest.fixture
+def celebrity_cache(scratch_mongodb_uri, scratch_dataset):
+    cache = CelebrityPostCache(scratch_mongodb_uri, follower_threshold=FOLLOWER_THRESHOLD, ttl_seconds=3600)
+    yield cache
+    cache.client.close()
+
+
+@pytest.fixture
+def queries(scratch_mongodb_uri, celebrity_cache):
+    queries = SocialNetworkQueries(scratch_mongodb_uri, celebrity_cache=celebrity_cache)
+    yield queries
+    queries.client.close()
+
+
+def test_cached_feed_matches_uncached_feed(scratch_mongodb_uri, scratch_dataset, queries):
+    _, ids = scratch_dataset
+    uncached = SocialNetworkQueries(scratch_mongodb_uri)
+    expected = uncached.get_friend_posts_last_24_hours(ids["heavy_user_id"])
+    uncached.client.close()
+
+    feed = queries.get_friend_posts_last_24_hours(ids["heavy_user_id"])
+
+    assert sorted(post["_id"] for post in feed) == sorted(post["_id"] for post in expected)
+    assert [post["createdAt"] for post in feed] == sorted((post["createdAt"] for post in feed), reverse=True)
+    assert all("username" in post and "topicName" in post for post in feed)
+
+
+def test_celebrity_feed_does_not_read_posts(scratch_dataset, queries):
+    _, ids = scratch_dataset
+    # The light user only follows the celebrity; the first call fills the cache
+    expected = queries.get_friend_posts_last_24_hours(ids["light_user_id"])
+
+    command_counter.reset()
+    feed = queries.get_friend_posts_last_24_hours(ids["light_user_id"])
+
+    assert command_counter.commands == ["find"]  # friendships only
+    assert [post["_id"] for post in feed] == [post["_id"] for post in expected]
+
+
+def test_celebrity_post_refreshes_writer_cache(scratch_mongodb_uri, scratch_dataset):
+    db, ids = scratch_dataset
+    celebrity, followers = ObjectId(), [ObjectId() for _ in range(FOLLOWER_THRESHOLD)]
+    db.users.insert_one({"_id": celebrity, "username": f"celebrity-{celebrity}"})
+    db.friendships.insert_many([{"userId": follower, "friendId": celebrity, "createdAt": datetime.now()}
+                                for follower in followers])
+
+    # A writer process whose cache has never served a feed, once its celebrities are computed
+    cache = CelebrityPostCache(scratch_mongodb_uri, follower_threshold=FOLLOWER_THRESHOLD, ttl_seconds=3600)
+    cache.refresh_celebrities()
+    writes = SocialNetworkWrites(scratch_mongodb_uri, celebrity_cache=cache)
+    post_id = writes.create_post(celebrity, ids["light_topic_id"], "hello followers")
+    writes.client.close()
+
+    _, cached_posts = cache.recent_posts[celebrity]
+    assert [post["_id"] for post in cached_posts] == [post_id]
+    assert cached_posts[0]["username"] == f"celebrity-{celebrity}"
+
+    queries = SocialNetworkQueries(scratch_mongodb_uri, celebrity_cache=cache)
+    assert [post["_id"] for post in queries.get_friend_posts_last_24_hours(followers[0])] == [post_id]
+    queries.client.close()
+    cache.client.close()
+
+
+def test_first_celebrity_refresh_does_not_block_writes(scratch_mongodb_uri, scratch_dataset, monkeypatch):
+    _, ids = scratch_dataset
+    cache = CelebrityPostCache(scratch_mongodb_uri, follower_threshold=FOLLOWER_THRESHOLD, ttl_seconds=3600)
+    release = threading.Event()
+    refresh = cache.refresh_celebrities
+
+    def blocked_refresh():
+        release.wait()
+        refresh()
+
+    monkeypatch.setattr(cache, "refresh_celebrities", blocked_refresh)
+    writes = SocialNetworkWrites(scratch_mongodb_uri, celebrity_cache=cache)
+
+    # Returns while the celebrities are still being computed, without reloading any list
+    writes.create_post(ids["light_user_id"], ids["light_topic_id"], "not blocked")
+    assert cache.celebrities_refreshing
+    assert cache.recent_posts == {}
+
+    release.set()
+    cache.celebrities_ready.wait()
+    assert cache.celebrities
+    writes.client.close()
+    cache.client.close()
+
+
+def test_slow_load_does_not_overwrite_a_newer_list(celebrity_cache, monkeypatch):
+    celebrity_id = next(iter(celebrity_cache.split_celebrities(celebrity_cache.friendships.distinct("friendId"))[0]))
+    find = celebrity_cache.posts.find
+    started, release = threading.Event(), threading.Event()
+
+    def slow_find(*args, **kwargs):
+        started.set()
+        release.wait()
+        return find(*args, **kwargs)
+
+    # A load that started first but finishes after a newer one
+    monkeypatch.setattr(celebrity_cache.posts, "find", slow_find)
+    slow = threading.Thread(target=celebrity_cache._load, args=([celebrity_id],))
+    slow.start()
+    started.wait()
+    monkeypatch.setattr(celebrity_cache.posts, "find", find)
+
+    celebrity_cache._load([celebrity_id])
+    newer = celebrity_cache.recent_posts[celebrity_id]
+    release.set()
+    slow.join()
+
+    assert celebrity_cache.recent_posts[celebrity_id] is newer
+
+
+def test_expired_list_is_reloaded_by_one_request(celebrity_cache, monkeypatch):
+    celebrity_ids = list(celebrity_cache.split_celebrities(celebrity_cache.friendships.distinct("friendId"))[0])
+    expected = celebrity_cache.get_recent_posts(celebrity_ids)
+    celebrity_cache.ttl_seconds = 0
+
+    loads = []
+    load = celebrity_cache._load
+
+    def slow_load(author_ids):
+        loads.append(author_ids)
+        time.sleep(0.5)
+        load(author_ids)
+
+    monkeypatch.setattr(celebrity_cache, "_load", slow_load)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def read_feed():
+        barrier.wait()
+        results.append(celebrity_cache.get_recent_posts(celebrity_ids))
+
+    threads = [threading.Thread(target=read_feed) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert all(result == expected for result in results)
+
+
+def test_celebrities_are_refreshed_in_the_background(celebrity_cache, monkeypatch):
+    author_ids = celebrity_cache.friendships.distinct("friendId")
+    expected = celebrity_cache.split_celebrities(author_ids)
+    celebrity_cache.refresh_seconds = 0
+
+    refreshes = []
+    release = threading.Event()
+    refresh = celebrity_cache.refresh_celebrities
+
+    def blocked_refresh():
+        refreshes.append(1)
+        release.wait()
+        refresh()
+
+    monkeypatch.setattr(celebrity_cache, "refresh_celebrities", blocked_refresh)
+
+    # Served from the previous set while a single refresh is running
+    assert [celebrity_cache.split_celebrities(author_ids) for _ in range(5)] == [expected] * 5
+    assert len(refreshes) == 1
+    release.set()
+    while celebrity_cache.celebrities_refreshing:
+        time.sleep(0.01)
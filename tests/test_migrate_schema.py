@@ -0,0 +1,88 @@
+import threading
+
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta
+from pymongo import MongoClient
+
+from migrate_schema import SchemaMigration
+from schema import Schema, COMPACT_COLLECTIONS
+
+
+def test_migration_catches_up_with_changes_between_runs(replica_set):
+    # Change streams need the replica set; a database of its own keeps the
+    # dataset of the read routing tests as seeded
+    client = MongoClient(replica_set["uri"], w=2)
+    client.drop_database("social_network_migration")
+    db = client["social_network_migration"]
+
+    now = datetime.now()
+    topic_id = ObjectId()
+    old, new = (ObjectId.from_datetime(now - timedelta(minutes=m)) for m in (10, 1))
+    db.posts.insert_many([
+        {"_id": post_id, "userId": ObjectId(), "topicId": topic_id, "content": "post",
+         "createdAt": now, "likeCount": 0, "commentCount": 0}
+        for post_id in (old, new)
+    ])
+
+    migration = SchemaMigration(db, batch_size=2)
+    assert migration.run()["posts"]["copied"] == 2
+
+    # An _id below the highest one copied, a counter $inc and a delete
+    lower = ObjectId.from_datetime(now - timedelta(minutes=5))
+    db.posts.insert_one({"_id": lower, "userId": ObjectId(), "topicId": topic_id, "content": "late",
+                         "createdAt": now, "likeCount": 0, "commentCount": 0})
+    db.posts.update_one({"_id": old}, {"$inc": {"likeCount": 3}})
+    db.posts.delete_one({"_id": new})
+
+    assert migration.run()["posts"] == {"copied": 0, "replayed": 3}
+
+    v2 = Schema(compact=True)
+    for name in COMPACT_COLLECTIONS:
+        migrated = v2.decode_all(v2.collection(db, name).find().sort("_id", 1))
+        assert migrated == list(db[name].find().sort("_id", 1))
+    assert [post["_id"] for post in db.posts_v2.find().sort("_id", 1)] == [old, lower]
+
+    client.drop_database("social_network_migration")
+    client.close()
+
+
+def test_replay_returns_while_the_source_keeps_changing(replica_set):
+    client = MongoClient(replica_set["uri"], w=2)
+    client.drop_database("social_network_migration")
+    db = client["social_network_migration"]
+    topic_id = ObjectId()
+
+    def post():
+        return {"_id": ObjectId(), "userId": ObjectId(), "topicId": topic_id, "content": "post",
+                "createdAt": datetime.now(), "likeCount": 0, "commentCount": 0}
+
+    db.posts.insert_one(post())
+    migration = SchemaMigration(db, batch_size=10)
+    migration.run()
+
+    # A writer that never leaves a quiet window in the change stream
+    stop = threading.Event()
+
+    def write():
+        while not stop.is_set():
+            db.posts.insert_one(post())
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        runner = threading.Thread(target=migration.run)
+        runner.start()
+        runner.join(timeout=30)
+        assert not runner.is_alive()
+    finally:
+        stop.set()
+        writer.join()
+
+    # The changes left after the first catch-up are picked up by the next run
+    migration.run()
+    v2 = Schema(compact=True)
+    migrated = v2.decode_all(v2.collection(db, "posts").find().sort("_id", 1))
+    assert migrated == list(db.posts.find().sort("_id", 1))
+
+    client.drop_database("social_network_migration")
+    client.close()
@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+from bson.objectid import ObjectId
+
+from post_search import HotTopicSearchCache
+from query_implementation import SocialNetworkQueries
+
+
+def test_search_counts_are_bounded():
+    cache = HotTopicSearchCache(hot_threshold=2, max_counted_topics=3)
+    topics = [ObjectId() for _ in range(5)]
+
+    for topic_id in topics:
+        assert cache.get(topic_id, list) is None
+    assert list(cache.search_counts) == topics[-3:]
+
+    # The least recently searched topics start counting again
+    assert cache.get(topics[0], list) is None
+    assert cache.get(topics[0], list) is not None
+
+
+def test_cache_cursor_is_rejected_without_the_cache():
+    # Rejected before any round trip, so no server is needed
+    queries = SocialNetworkQueries("mongodb://127.0.0.1:1/")
+    cursor = {"source": "cache", "score": 1.5, "_id": ObjectId()}
+
+    with pytest.raises(ValueError):
+        queries.search_posts_on_topic(ObjectId(), "word", after=cursor)
+    with pytest.raises(ValueError):
+        queries.search_posts_on_topic(ObjectId(), "word", after=dict(cursor, source="other"))
+    with pytest.raises(ValueError):
+        queries.search_posts_on_topic(ObjectId(), "word", after={"source": "server", "score": 1.5})
+    queries.client.close()
+
+
+def test_hot_topic_index_is_built_by_one_search():
+    cache = HotTopicSearchCache(hot_threshold=1)
+    topic_id = ObjectId()
+    loads = []
+
+    def slow_load():
+        loads.append(1)
+        time.sleep(0.5)
+        return [{"_id": ObjectId(), "content": "word"}]
+
+    barrier = threading.Barrier(8)
+    results = []
+
+    def search(require):
+        barrier.wait()
+        results.append((require, cache.get(topic_id, slow_load, require=require)))
+
+    threads = [threading.Thread(target=search, args=(i % 2 == 0,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Searches that do not need the index go to the server while it is built,
+    # those that need it wait for the one being built
+    assert len(loads) == 1
+    index = cache.indexes[topic_id]
+    assert all(result is index for require, result in results if require)
+    assert sum(result is None for _, result in results) >= 3
@@ -0,0 +1,72 @@
+import pytest
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+from query_implementation import SocialNetworkQueries
+from conftest import command_counter
+
+
+def addresses_of(query, *args, **kwargs):
+    """Run a query and return the set of servers its commands were sent to"""
+    command_counter.reset()
+    query(*args, **kwargs)
+    return set(command_counter.addresses)
+
+
+def test_analytics_reads_go_to_secondary(replica_set, replica_set_dataset):
+    queries = SocialNetworkQueries(replica_set["uri"])
+    secondary = {replica_set["secondary"]}
+
+    assert addresses_of(queries.get_top_k_popular_topics, 5) == secondary
+    assert addresses_of(queries.get_all_posts_on_topic, replica_set_dataset["heavy_topic_id"]) == secondary
+    assert addresses_of(queries.get_all_posts_by_user, replica_set_dataset["heavy_user_id"]) == secondary
+    queries.client.close()
+
+
+def test_feed_reads_go_to_primary(replica_set, replica_set_dataset):
+    queries = SocialNetworkQueries(replica_set["uri"])
+
+    addresses = addresses_of(queries.get_friend_posts_last_24_hours, replica_set_dataset["heavy_user_id"])
+    assert addresses == {replica_set["primary"]}
+    queries.client.close()
+
+
+def test_consistency_class_is_configurable(replica_set, replica_set_dataset):
+    queries = SocialNetworkQueries(replica_set["uri"], consistency={"get_top_k_popular_topics": "strong"})
+
+    assert addresses_of(queries.get_top_k_popular_topics, 5) == {replica_set["primary"]}
+    queries.client.close()
+
+
+def test_session_reads_its_own_writes_on_secondary(replica_set, replica_set_dataset):
+    queries = SocialNetworkQueries(replica_set["uri"])
+    topic_id = replica_set_dataset["light_topic_id"]
+    post_id = ObjectId()
+
+    with queries.start_session() as session:
+        queries.posts.insert_one({
+            "_id": post_id,
+            "userId": replica_set_dataset["light_user_id"],
+            "content": "read your writes",
+            "topicId": topic_id,
+            "createdAt": datetime.now(),
+            "likeCount": 0,
+            "commentCount": 0
+        }, session=session)
+
+        command_counter.reset()
+        posts = queries.get_all_posts_on_topic(topic_id, session=session)
+
+    assert replica_set["secondary"] in command_counter.addresses
+    assert post_id in [post["_id"] for post in posts]
+    queries.client.close()
+
+
+def test_invalid_routing_options_are_rejected():
+    with pytest.raises(ValueError):
+        SocialNetworkQueries("mongodb://127.0.0.1:1/", consistency={"get_top_k_popular_topic": "strong"})
+    with pytest.raises(ValueError):
+        SocialNetworkQueries("mongodb://127.0.0.1:1/", consistency={"get_top_k_popular_topics": "fast"})
+    with pytest.raises(ValueError):
+        SocialNetworkQueries("mongodb://127.0.0.1:1/", max_staleness_seconds=30)
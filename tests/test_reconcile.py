@@ -0,0 +1,68 @@
+import time
+
+from reconcile import CounterReconciler, _Throttle
+
+# The seeded posts have random likeCount and commentCount values, but no
+# likes and only the comments of the light and heavy users, so most drift
+
+
+def counters(db):
+    return list(db.posts.find({}, {"likeCount": 1, "commentCount": 1}).sort("_id", 1))
+
+
+def test_dry_run_reports_drift_without_fixing(scratch_dataset):
+    db, _ = scratch_dataset
+    before = counters(db)
+    comment_counts = {row["_id"]: row["n"] for row in db.comments.aggregate([{"$group": {"_id": "$postId", "n": {"$sum": 1}}}])}
+
+    report = CounterReconciler(db, dry_run=True).run()
+
+    assert report["likeCountMismatches"] == sum(post["likeCount"] != 0 for post in before)
+    assert report["commentCountMismatches"] == sum(
+        post["commentCount"] != comment_counts.get(post["_id"], 0) for post in before)
+    assert report["topicPostCountMismatches"] == 0
+    assert report["fixed"] == 0
+    assert counters(db) == before
+
+
+def test_reconcile_fixes_drift(scratch_dataset):
+    db, ids = scratch_dataset
+    db.topics.update_one({"_id": ids["light_topic_id"]}, {"$inc": {"postCount": 5}})
+
+    report = CounterReconciler(db, num_workers=3, batch_size=7).run()
+    assert report["topicPostCountMismatches"] == 1
+    assert report["fixed"] == (report["likeCountMismatches"] + report["commentCountMismatches"]
+                               + report["topicPostCountMismatches"])
+
+    for post in db.posts.find():
+        assert post["likeCount"] == db.likes.count_documents({"postId": post["_id"]})
+        assert post["commentCount"] == db.comments.count_documents({"postId": post["_id"]})
+    for topic in db.topics.find():
+        assert topic["postCount"] == db.posts.count_documents({"topicId": topic["_id"]})
+
+    report = CounterReconciler(db, dry_run=True).run()
+    assert (report["likeCountMismatches"], report["commentCountMismatches"],
+            report["topicPostCountMismatches"]) == (0, 0, 0)
+
+
+def test_throttle_is_charged_every_document_scanned(scratch_dataset):
+    db, _ = scratch_dataset
+    reconciler = CounterReconciler(db, batch_size=10, max_docs_per_second=1e9, dry_run=True)
+
+    report = reconciler.run()
+
+    assert report["commentsScanned"] > 0
+    assert reconciler.throttle.count == report["docsScanned"]
+
+
+def test_throttle_does_not_save_up_idle_time():
+    throttle = _Throttle(max_docs_per_second=100)
+    time.sleep(0.3)
+
+    start_time = time.monotonic()
+    throttle.wait(10)
+    throttle.wait(10)
+
+    # 20 documents at 100 per second; the idle 0.3 seconds are not spent as a burst
+    assert time.monotonic() - start_time >= 0.18
+    assert throttle.count == 20
@@ -0,0 +1,101 @@
+import pytest
+
+import queries.query1 as query1
+import queries.query2 as query2
+from query_implementation import SocialNetworkQueries
+from post_search import HotTopicSearchCache
+
+# Query name -> (module implementing it, input id key, extra arguments,
+#                round trip budget)
+QUERIES = {
+    "get_all_posts_by_user": (query1, "user_id", {}, 1),
+    "get_top_k_most_liked_posts_by_user": (query1, "user_id", {"k": 10}, 1),
+    "get_top_k_most_commented_posts_by_user": (query1, "user_id", {"k": 10}, 1),
+    "get_all_comments_by_user": (query1, "user_id", {}, 2),
+    "get_all_posts_on_topic": (query2, "topic_id", {}, 2),
+    "get_top_k_popular_topics": (query2, None, {}, 1),
+    "get_friend_posts_last_24_hours": (query2, "user_id", {}, 4),
+}
+
+# Popular topics take no id; its result size is driven by k instead
+TOP_TOPICS_K = {"light": 2, "heavy": 7}
+
+
+def max_docs_examined(name, result, db, dataset, size):
+    """Documents a query may examine with the indexes in schema.INDEXES"""
+    if name == "get_all_comments_by_user":
+        # The comments plus one post lookup each
+        return 2 * len(result)
+    if name == "get_all_posts_on_topic":
+        return len(result) + len({post["userId"] for post in result})
+    if name == "get_friend_posts_last_24_hours":
+        friends = db.friendships.count_documents({"userId": dataset[f"{size}_user_id"]})
+        return (friends + len(result)
+                + len({post["userId"] for post in result})
+                + len({post["topicId"] for post in result}))
+    return len(result)
+
+
+@pytest.fixture
+def implementations(mongodb_uri, mongo_client, monkeypatch):
+    """The query functions of SocialNetworkQueries and of the queries/ modules, by name"""
+    monkeypatch.setattr(query1, "db", mongo_client["social_network"])
+    monkeypatch.setattr(query2, "db", mongo_client["social_network"])
+    social_network_queries = SocialNetworkQueries(mongodb_uri)
+
+    def get(implementation, name):
+        if implementation == "class":
+            return getattr(social_network_queries, name)
+        return getattr(QUERIES[name][0], name)
+
+    yield get
+    social_network_queries.client.close()
+
+
+def run_query(measure, query, name, dataset, size):
+    module, id_key, kwargs, budget = QUERIES[name]
+    if id_key is None:
+        return measure(query, k=TOP_TOPICS_K[size])
+    return measure(query, dataset[f"{size}_{id_key}"], **kwargs)
+
+
+@pytest.mark.parametrize("implementation", ["class", "module"])
+@pytest.mark.parametrize("size", ["light", "heavy"])
+@pytest.mark.parametrize("name", list(QUERIES))
+def test_query_within_budget(name, size, implementation, implementations, measure, mongo_client, dataset):
+    query = implementations(implementation, name)
+    result, commands, docs_examined = run_query(measure, query, name, dataset, size)
+
+    assert result
+    assert len(commands) <= QUERIES[name][3], commands
+    assert docs_examined <= max_docs_examined(name, result, mongo_client["social_network"], dataset, size)
+
+
+@pytest.mark.parametrize("implementation", ["class", "module"])
+@pytest.mark.parametrize("name", list(QUERIES))
+def test_round_trips_do_not_grow_with_result_size(name, implementation, implementations, measure, dataset):
+    query = implementations(implementation, name)
+    light_result, light_commands, _ = run_query(measure, query, name, dataset, "light")
+    heavy_result, heavy_commands, _ = run_query(measure, query, name, dataset, "heavy")
+
+    assert len(heavy_result) > len(light_result)
+    assert heavy_commands == light_commands
+
+
+@pytest.mark.parametrize("size", ["light", "heavy"])
+def test_search_round_trips(size, mongodb_uri, mongo_client, measure, dataset):
+    topic_id = dataset[f"{size}_topic_id"]
+    post = mongo_client["social_network"].posts.find_one({"topicId": topic_id})
+    text = max(post["content"].split(), key=len)
+
+    social_network_queries = SocialNetworkQueries(mongodb_uri, search_cache=HotTopicSearchCache(hot_threshold=2))
+    result, commands, _ = measure(social_network_queries.search_posts_on_topic, topic_id, text, k=50)
+    assert result["posts"]
+    assert commands == ["aggregate", "find"]
+
+    # The second search makes the topic hot and loads its index, later ones stay in-process
+    social_network_queries.search_posts_on_topic(topic_id, text, k=50)
+    cached, commands, _ = measure(social_network_queries.search_posts_on_topic, topic_id, text, k=50)
+    assert cached["posts"]
+    assert commands == []
+    social_network_queries.client.close()
@@ -0,0 +1,33 @@
+import pytest
+from bson.objectid import ObjectId
+
+from snapshot import export_snapshot, restore_snapshot, read_sample_ids
+
+
+def contents(db):
+    """Documents and index keys of every collection"""
+    return {
+        name: (list(db[name].find().sort("_id", 1)),
+               sorted(str(index["key"]) for index in db[name].list_indexes()))
+        for name in sorted(db.list_collection_names()) if not name.startswith("system.")
+    }
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_export_restore_round_trip(scratch_dataset, tmp_path, compress):
+    db, ids = scratch_dataset
+    path = tmp_path / "social_network.snapshot"
+    sample_ids = {"sample_user_id": ids["heavy_user_id"], "sample_topic_id": ids["heavy_topic_id"],
+                  "sample_post_id": None}
+    before = contents(db)
+
+    counts = export_snapshot(db, path, sample_ids=sample_ids, compress=compress, batch_size=7)
+    assert counts == {name: len(docs) for name, (docs, _) in before.items()}
+    assert read_sample_ids(path) == sample_ids
+
+    db.posts.delete_many({"userId": ids["heavy_user_id"]})
+    db.posts.insert_one({"_id": ObjectId(), "content": "not in the snapshot"})
+    db.topics.drop_indexes()
+
+    assert restore_snapshot(db, path, num_workers=3, batch_size=7) == sample_ids
+    assert contents(db) == before
@@ -0,0 +1,71 @@
+from bson.objectid import ObjectId
+from collections import Counter
+from datetime import datetime, timedelta
+
+from initialization import SocialNetworkDB
+from query_implementation import SocialNetworkQueries
+from user_stats import UserStatsRollup, STAT_FIELDS
+from conftest import command_counter, DB_NAME
+
+
+def test_generate_data_maintains_stats_incrementally(scratch_mongodb_uri):
+    generator = SocialNetworkDB(scratch_mongodb_uri)
+    generator.generate_data(num_users=15, num_topics=3, max_friends_per_user=6, max_posts_per_user=6,
+                            max_likes_per_post=5, max_comments_per_post=3)
+    db = generator.db
+
+    authors = {post["_id"]: post["userId"] for post in db.posts.find({}, {"userId": 1})}
+    expected = {user["_id"]: Counter() for user in db.users.find({}, {"_id": 1})}
+    for post_author in authors.values():
+        expected[post_author]["postCount"] += 1
+    for like in db.likes.find():
+        expected[authors[like["postId"]]]["likesReceived"] += 1
+    for comment in db.comments.find():
+        expected[comment["userId"]]["commentCount"] += 1
+        expected[authors[comment["postId"]]]["commentsReceived"] += 1
+
+    for user_id, counts in expected.items():
+        stats = generator.user_stats.get(user_id)
+        assert {field: stats[field] for field in STAT_FIELDS} == {field: counts[field] for field in STAT_FIELDS}
+    generator.client.close()
+
+
+def test_get_user_stats_is_a_single_point_read(scratch_mongodb_uri, scratch_dataset):
+    db, ids = scratch_dataset
+    UserStatsRollup(db).rebuild()
+    queries = SocialNetworkQueries(scratch_mongodb_uri)
+
+    db.command("profile", 2)
+    command_counter.reset()
+    stats = queries.get_user_stats(ids["heavy_user_id"])
+    commands = list(command_counter.commands)
+    db.command("profile", 0)
+
+    assert stats["postCount"] == 40
+    assert commands == ["find"]
+    reads = list(db.system.profile.find({"ns": f"{DB_NAME}.user_stats", "op": "query"}))
+    assert len(reads) == 1
+    assert reads[0]["keysExamined"] <= 1 and reads[0]["docsExamined"] <= 1
+    queries.client.close()
+
+
+def test_rebuild_user_stats_counts_likes_and_replaces_in_place(scratch_dataset):
+    db, ids = scratch_dataset
+    heavy_user = ids["heavy_user_id"]
+    liked_post = db.posts.find_one({"userId": heavy_user})
+    db.likes.insert_one({"postId": liked_post["_id"], "userId": ObjectId(), "createdAt": datetime.now()})
+
+    inactive_user = ObjectId()
+    db.user_stats.insert_many([
+        {"_id": heavy_user, "postCount": 1, "updatedAt": datetime.now() - timedelta(days=1)},
+        {"_id": inactive_user, "postCount": 3, "updatedAt": datetime.now() - timedelta(days=1)}
+    ])
+
+    rollup = UserStatsRollup(db)
+    rollup.rebuild(num_workers=3)
+
+    # likesReceived comes from the likes collection, not the drifted likeCount
+    stats = rollup.get(heavy_user)
+    assert (stats["postCount"], stats["likesReceived"], stats["commentsReceived"], stats["commentCount"]) == (
+        40, 1, 0, db.comments.count_documents({"userId": heavy_user}))
+    assert db.user_stats.find_one({"_id": inactive_user}) is None
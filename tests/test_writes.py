@@ -0,0 +1,112 @@
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import NetworkTimeout
+
+from write_implementation import SocialNetworkWrites, MicroBatcher
+from query_implementation import SocialNetworkQueries
+
+
+@pytest.fixture
+def writes(scratch_mongodb_uri, scratch_dataset):
+    writes = SocialNetworkWrites(scratch_mongodb_uri)
+    yield writes
+    writes.client.close()
+
+
+@pytest.fixture
+def topic_id(writes):
+    return writes.topics.insert_one({"name": f"Topic-{ObjectId()}", "postCount": 0}).inserted_id
+
+
+def test_post_is_read_back_in_the_writing_session(scratch_mongodb_uri, scratch_dataset):
+    queries = SocialNetworkQueries(scratch_mongodb_uri)
+    writes = SocialNetworkWrites(client=queries.client)
+    author, topic_id = ObjectId(), scratch_dataset[1]["light_topic_id"]
+
+    with queries.start_session() as session:
+        post_id = writes.create_post(author, topic_id, "read your writes", session=session)
+        posts = queries.get_all_posts_by_user(author, session=session)
+
+    assert [post["_id"] for post in posts] == [post_id]
+    queries.client.close()
+
+
+def test_writes_keep_counters_consistent(writes, topic_id):
+    author, fan = ObjectId(), ObjectId()
+    post_ids = writes.create_posts([{"userId": author, "topicId": topic_id, "content": f"post {i}"} for i in range(3)])
+
+    assert writes.like_posts([(fan, post_ids[0]), (fan, post_ids[1]), (author, post_ids[0])]) == [True, True, True]
+    writes.add_comments([{"userId": fan, "postId": post_id, "content": "nice"} for post_id in post_ids])
+
+    assert writes.topics.find_one({"_id": topic_id})["postCount"] == 3
+    assert writes.posts.find_one({"_id": post_ids[0]})["likeCount"] == 2
+    assert writes.posts.find_one({"_id": post_ids[2]})["commentCount"] == 1
+
+    stats = writes.user_stats.get(author)
+    assert (stats["postCount"], stats["likesReceived"], stats["commentsReceived"]) == (3, 3, 3)
+    assert writes.user_stats.get(fan)["commentCount"] == 3
+
+    for post_id in post_ids:
+        post = writes.posts.find_one({"_id": post_id})
+        assert post["likeCount"] == writes.likes.count_documents({"postId": post_id})
+        assert post["commentCount"] == writes.comments.count_documents({"postId": post_id})
+
+
+def test_retried_writes_are_not_double_counted(writes, topic_id):
+    author, fan = ObjectId(), ObjectId()
+    post_id = writes.create_post(author, topic_id, "hello", post_id=ObjectId())
+    assert writes.create_post(author, topic_id, "hello", post_id=post_id) == post_id
+
+    assert writes.like_post(fan, post_id) is True
+    assert writes.like_post(fan, post_id) is False
+    assert writes.like_posts([(fan, post_id), (author, post_id), (author, post_id)]) == [False, True, False]
+
+    comment_id = ObjectId()
+    writes.add_comment(fan, post_id, "first", comment_id=comment_id)
+    writes.add_comment(fan, post_id, "first", comment_id=comment_id)
+
+    post = writes.posts.find_one({"_id": post_id})
+    assert (post["likeCount"], post["commentCount"]) == (2, 1)
+    assert writes.topics.find_one({"_id": topic_id})["postCount"] == 1
+    assert writes.likes.count_documents({"postId": post_id}) == 2
+
+
+def test_retry_after_failed_batch_counts_once(writes, topic_id, monkeypatch):
+    author, post_id = ObjectId(), ObjectId()
+    increment = writes.user_stats.increment
+
+    def time_out_once(*args, **kwargs):
+        monkeypatch.setattr(writes.user_stats, "increment", increment)
+        raise NetworkTimeout("timed out")
+
+    monkeypatch.setattr(writes.user_stats, "increment", time_out_once)
+    with pytest.raises(NetworkTimeout):
+        writes.create_post(author, topic_id, "hello", post_id=post_id)
+    assert writes.posts.find_one({"_id": post_id}) is None
+
+    assert writes.create_post(author, topic_id, "hello", post_id=post_id) == post_id
+    assert writes.topics.find_one({"_id": topic_id})["postCount"] == 1
+    assert writes.user_stats.get(author)["postCount"] == 1
+
+
+def test_writes_on_missing_posts_are_not_stored(writes):
+    fan, missing_post = ObjectId(), ObjectId()
+
+    assert writes.like_post(fan, missing_post) is False
+    assert writes.add_comment(fan, missing_post, "hello?") is None
+
+    assert writes.likes.count_documents({"postId": missing_post}) == 0
+    assert writes.comments.count_documents({"postId": missing_post}) == 0
+    assert writes.user_stats.get(fan)["commentCount"] == 0
+
+
+def test_micro_batcher_deduplicates_concurrent_likes(writes, topic_id):
+    post_id = writes.create_post(ObjectId(), topic_id, "popular")
+    fans = [ObjectId() for _ in range(50)]
+
+    batcher = MicroBatcher(writes, max_batch_size=20)
+    futures = [batcher.like_post(fan, post_id) for fan in fans + fans]
+    batcher.close()
+
+    assert sum(future.result() for future in futures) == len(fans)
+    assert writes.posts.find_one({"_id": post_id})["likeCount"] == len(fans)
@@ -0,0 +1,201 @@
+from pymongo import MongoClient, UpdateOne
+from bson.objectid import ObjectId
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from schema import Schema
+
+STAT_FIELDS = ("postCount", "likesReceived", "commentsReceived", "commentCount")
+
+
+def split_id_range(collection, num_ranges):
+    """
+    Split the _id space of a collection into contiguous [lower, upper) ranges
+    :param collection: Collection whose documents have ObjectId _ids
+    :param num_ranges: Number of ranges to produce
+    :return: List of (lower, upper) tuples, None meaning unbounded
+    """
+    first = collection.find_one({}, {"_id": 1}, sort=[("_id", 1)])
+    last = collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    if first is None:
+        return []
+
+    # ObjectIds are ordered by creation time first, so splitting the
+    # timestamp span gives ranges of roughly equal size
+    start = first["_id"].generation_time
+    span = last["_id"].generation_time - start + timedelta(seconds=1)
+
+    bounds = [None]
+    for i in range(1, num_ranges):
+        bounds.append(ObjectId.from_datetime(start + span * i / num_ranges))
+    bounds.append(None)
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def id_range_filter(field, lower, upper):
+    """Build a filter matching field values in [lower, upper)"""
+    id_range = {}
+    if lower is not None:
+        id_range["$gte"] = lower
+    if upper is not None:
+        id_range["$lt"] = upper
+    return {field: id_range} if id_range else {}
+
+
+class UserStatsRollup:
+    def __init__(self, db, schema=None):
+        """
+        Per-user stats rollup stored in the user_stats collection.
+        One document per user, keyed by the user's _id, so reading a user's
+        stats is a single point read on the _id index.
+        :param db: pymongo Database holding the social network collections
+        :param schema: Schema of the posts and comments collections, v1 if None
+        """
+        self.db = db
+        self.schema = schema or Schema()
+        self.user_stats = db["user_stats"]
+        self.users = db["users"]
+        self.posts = self.schema.collection(db, "posts")
+        self.likes = self.schema.collection(db, "likes")
+        self.comments = self.schema.collection(db, "comments")
+
+    def increment(self, deltas, session=None):
+        """
+        Apply counter increments to many users in one bulk write
+        :param deltas: Dict of user_id -> {stat field: amount}
+        :param session: Optional client session
+        """
+        operations = []
+        for user_id, fields in deltas.items():
+            fields = {field: amount for field, amount in fields.items() if amount}
+            if not fields:
+                continue
+            operations.append(UpdateOne(
+                {"_id": user_id},
+                {"$inc": fields, "$set": {"updatedAt": datetime.now()}},
+                upsert=True
+            ))
+
+        if operations:
+            self.user_stats.bulk_write(operations, ordered=False, session=session)
+
+    def record_post(self, author_id):
+        """Count a new post for its author"""
+        self.increment({author_id: {"postCount": 1}})
+
+    def record_like(self, post_author_id):
+        """Count a like received on one of the author's posts"""
+        self.increment({post_author_id: {"likesReceived": 1}})
+
+    def record_comment(self, commenter_id, post_author_id):
+        """Count a comment written by commenter_id on a post by post_author_id"""
+        if commenter_id == post_author_id:
+            self.increment({commenter_id: {"commentCount": 1, "commentsReceived": 1}})
+        else:
+            self.increment({
+                commenter_id: {"commentCount": 1},
+                post_author_id: {"commentsReceived": 1}
+            })
+
+    def get(self, user_id, collection=None, session=None):
+        """
+        Get the stats of a user with a single point read
+        :param user_id: ObjectId of the user
+        :param collection: user_stats handle to read from, e.g. with a read preference
+        :param session: Optional client session
+        :return: Stats document, zeroed if the user has no activity yet
+        """
+        user_id = ObjectId(user_id) if isinstance(user_id, str) else user_id
+        collection = self.user_stats if collection is None else collection
+        stats = collection.find_one({"_id": user_id}, session=session)
+        if stats is None:
+            stats = {"_id": user_id}
+        for field in STAT_FIELDS:
+            stats.setdefault(field, 0)
+        return stats
+
+    def _count_lookup(self, collection, name):
+        """$lookup counting the documents of a collection that reference the current post"""
+        s = self.schema
+        return {"$lookup": {
+            "from": collection.name,
+            "let": {"postId": "$_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$" + s.f("postId"), "$$postId"]}}},
+                {"$count": "n"}
+            ],
+            "as": name
+        }}
+
+    def _rebuild_range(self, lower, upper, rebuilt_at):
+        """Recompute the stats of users whose _id falls in [lower, upper)"""
+        s = self.schema
+        match = id_range_filter(s.f("userId"), lower, upper)
+
+        # Posts with the likes and comments they received, counted from the
+        # likes and comments collections rather than the denormalized post
+        # counters, plus the comments written by each user
+        self.posts.aggregate([
+            {"$match": match},
+            self._count_lookup(self.likes, "likes"),
+            self._count_lookup(self.comments, "comments"),
+            {"$project": {
+                "_id": "$" + s.f("userId"),
+                "postCount": {"$literal": 1},
+                "likesReceived": {"$ifNull": [{"$first": "$likes.n"}, 0]},
+                "commentsReceived": {"$ifNull": [{"$first": "$comments.n"}, 0]},
+                "commentCount": {"$literal": 0}
+            }},
+            {"$unionWith": {"coll": self.comments.name, "pipeline": [
+                {"$match": match},
+                {"$project": {
+                    "_id": "$" + s.f("userId"),
+                    "postCount": {"$literal": 0},
+                    "likesReceived": {"$literal": 0},
+                    "commentsReceived": {"$literal": 0},
+                    "commentCount": {"$literal": 1}
+                }}
+            ]}},
+            {"$group": {"_id": "$_id", **{field: {"$sum": "$" + field} for field in STAT_FIELDS}}},
+            {"$set": {"updatedAt": rebuilt_at, "rebuiltAt": rebuilt_at}},
+            {"$merge": {
+                "into": "user_stats",
+                "on": "_id",
+                "whenMatched": "replace",
+                "whenNotMatched": "insert"
+            }}
+        ])
+
+    def rebuild(self, num_workers=4):
+        """
+        Rebuild the whole user_stats collection from posts, likes and comments.
+        Used for backfill and repair; the user _id space is split into ranges
+        that are aggregated in parallel and merged into user_stats on the
+        server. Documents are replaced in place, so readers never see empty
+        stats; documents of users without any activity that were not written
+        since the rebuild started are deleted afterwards. An increment landing
+        between a user's recount and its replacement can still be counted
+        twice or lost.
+        :param num_workers: Number of ranges processed concurrently
+        :return: Number of users with stats
+        """
+        rebuilt_at = datetime.now()
+
+        ranges = split_id_range(self.users, num_workers)
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(self._rebuild_range, lower, upper, rebuilt_at) for lower, upper in ranges]
+            for future in futures:
+                future.result()
+
+        self.user_stats.delete_many({"rebuiltAt": {"$ne": rebuilt_at}, "updatedAt": {"$lt": rebuilt_at}})
+
+        return self.user_stats.count_documents({})
+
+
+# Backfill the rollup for an existing dataset
+if __name__ == "__main__":
+    client = MongoClient("mongodb://localhost:27017/")
+    rollup = UserStatsRollup(client["social_network"])
+    count = rollup.rebuild()
+    print(f"Rebuilt stats for {count} users")
@@ -0,0 +1,347 @@
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+from bson.objectid import ObjectId
+from collections import Counter
+from concurrent.futures import Future
+from datetime import datetime
+import threading
+import time
+
+from user_stats import UserStatsRollup
+from schema import Schema
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _object_id(value):
+    return ObjectId(value) if isinstance(value, str) else value
+
+
+class SocialNetworkWrites:
+    def __init__(self, connection_string="mongodb://localhost:27017/", compact_schema=False,
+                 search_cache=None, celebrity_cache=None, client=None):
+        """
+        Write API for posts, likes and comments. Every method takes a batch;
+        the single-write methods are batches of one. Writes are idempotent
+        under retries: posts and comments by their _id, likes by the unique
+        (postId, userId) key. Each batch is one transaction, so documents
+        and the counters they move commit together; a retry after a timeout
+        finds the documents with their counters already applied. Needs a
+        replica set or sharded cluster for transactions.
+        :param connection_string: MongoDB connection string
+        :param compact_schema: Write the compact schema v2 collections
+        :param search_cache: post_search.HotTopicSearchCache to invalidate on new posts
+        :param celebrity_cache: celebrity_cache.CelebrityPostCache to refresh when a celebrity posts
+        :param client: MongoClient to share instead of connecting to connection_string, e.g. the
+                       client of a SocialNetworkQueries, whose start_session() sessions can then
+                       be passed to the writes; sessions only work with the client that started them
+        """
+        self.client = client if client is not None else MongoClient(connection_string)
+        self.db = self.client["social_network"]
+        self.schema = Schema(compact_schema)
+        self.search_cache = search_cache
+        self.celebrity_cache = celebrity_cache
+
+        self.topics = self.db["topics"]
+        self.posts = self.schema.collection(self.db, "posts")
+        self.likes = self.schema.collection(self.db, "likes")
+        self.comments = self.schema.collection(self.db, "comments")
+        self.user_stats = UserStatsRollup(self.db, self.schema)
+
+        self._create_indexes()
+
+    def _create_indexes(self):
+        """One like per user and post; postId first so it is prefixed by the likes shard key"""
+        s = self.schema
+        self.likes.create_index([(s.f("postId"), 1), (s.f("userId"), 1)], unique=True)
+
+    def _transaction(self, callback, session=None):
+        """
+        Run callback(session) in a transaction, so documents and the counters
+        they move are committed together or not at all
+        :param session: Session to run the transaction in, a new one if None
+        :return: Result of the callback
+        """
+        while True:
+            try:
+                if session is not None:
+                    return session.with_transaction(callback)
+                with self.client.start_session() as new_session:
+                    return new_session.with_transaction(callback)
+            except BulkWriteError as e:
+                # A concurrent transaction committed the same document first;
+                # the next attempt finds it and skips it
+                if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details["writeErrors"]):
+                    raise
+
+    def _existing_ids(self, collection, ids, session):
+        """_ids of the given ones that are already stored"""
+        return {doc["_id"] for doc in collection.find({"_id": {"$in": list(ids)}}, {"_id": 1}, session=session)}
+
+    def _inc(self, collection, field, counts, session=None):
+        """$inc a counter on many documents in one bulk write"""
+        operations = [UpdateOne({"_id": _id}, {"$inc": {field: n}}) for _id, n in counts.items() if n]
+        if operations:
+            collection.bulk_write(operations, ordered=False, session=session)
+
+    def _post_authors(self, post_ids, session=None):
+        """Map post ids to their authors in one round trip; missing posts are left out"""
+        s = self.schema
+        post_ids = list(set(post_ids))
+        if not post_ids:
+            return {}
+        posts = self.posts.find({"_id": {"$in": post_ids}}, {s.f("userId"): 1}, session=session)
+        return {post["_id"]: post[s.f("userId")] for post in posts}
+
+    def create_posts(self, posts, session=None):
+        """
+        Create a batch of posts
+        :param posts: List of dicts with userId, topicId, content and optionally _id and createdAt
+        :param session: Optional session, e.g. SocialNetworkQueries.start_session()
+        :return: List of the post ids, in input order
+        """
+        s = self.schema
+        docs = []
+        for post in posts:
+            docs.append({
+                "_id": _object_id(post.get("_id")) or ObjectId(),
+                "userId": _object_id(post["userId"]),
+                "content": post["content"],
+                "topicId": _object_id(post["topicId"]),
+                "createdAt": post.get("createdAt") or datetime.now(),
+                "likeCount": 0,
+                "commentCount": 0
+            })
+        unique_docs = list({doc["_id"]: doc for doc in reversed(docs)}.values())
+
+        def insert(session):
+            # Posts that exist were committed together with their counters
+            existing = self._existing_ids(self.posts, [doc["_id"] for doc in unique_docs], session)
+            new_posts = [doc for doc in unique_docs if doc["_id"] not in existing]
+            if new_posts:
+                self.posts.insert_many([s.fields(doc) for doc in new_posts], session=session)
+
+            self._inc(self.topics, "postCount", Counter(doc["topicId"] for doc in new_posts), session)
+            self.user_stats.increment({
+                author: {"postCount": n} for author, n in Counter(doc["userId"] for doc in new_posts).items()
+            }, session)
+            return new_posts
+
+        new_posts = self._transaction(insert, session)
+
+        if self.search_cache is not None:
+            for topic_id in {doc["topicId"] for doc in new_posts}:
+                self.search_cache.invalidate(topic_id)
+        if self.celebrity_cache is not None:
+            self.celebrity_cache.refresh_authors(doc["userId"] for doc in new_posts)
+
+        return [doc["_id"] for doc in docs]
+
+    def create_post(self, user_id, topic_id, content, post_id=None, session=None):
+        """
+        Create a post
+        :param post_id: Client-generated _id, makes retries idempotent
+        :return: ObjectId of the post
+        """
+        return self.create_posts([{"_id": post_id, "userId": user_id, "topicId": topic_id, "content": content}],
+                                 session)[0]
+
+    def like_posts(self, likes, session=None):
+        """
+        Like a batch of posts; a user likes a post at most once
+        :param likes: List of (user_id, post_id) pairs
+        :param session: Optional session, e.g. SocialNetworkQueries.start_session()
+        :return: List of booleans, True where the like is new, in input order;
+                 likes of posts that do not exist are not stored and are False
+        """
+        s = self.schema
+        pairs = [(_object_id(user_id), _object_id(post_id)) for user_id, post_id in likes]
+        unique_pairs = list(dict.fromkeys(pairs))
+        if not unique_pairs:
+            return []
+
+        def upsert(session):
+            authors = self._post_authors([post_id for _, post_id in unique_pairs], session)
+            liked = [(user_id, post_id) for user_id, post_id in unique_pairs if post_id in authors]
+            if not liked:
+                return []
+
+            now = datetime.now()
+            result = self.likes.bulk_write([
+                UpdateOne(
+                    {s.f("postId"): post_id, s.f("userId"): user_id},
+                    {"$setOnInsert": {s.f("createdAt"): now}},
+                    upsert=True
+                )
+                for user_id, post_id in liked
+            ], ordered=False, session=session)
+
+            new_likes = [liked[i] for i in sorted(result.upserted_ids)]
+            like_counts = Counter(post_id for _, post_id in new_likes)
+            self._inc(self.posts, s.f("likeCount"), like_counts, session)
+
+            received = Counter()
+            for post_id, n in like_counts.items():
+                received[authors[post_id]] += n
+            self.user_stats.increment({author: {"likesReceived": n} for author, n in received.items()}, session)
+            return new_likes
+
+        new_likes = self._transaction(upsert, session)
+
+        # Report each new like once, for its first occurrence in the input
+        new_set = set(new_likes)
+        results = []
+        for pair in pairs:
+            results.append(pair in new_set)
+            new_set.discard(pair)
+        return results
+
+    def like_post(self, user_id, post_id, session=None):
+        """
+        Like a post
+        :return: True if the like is new, False if the user already liked the post
+                 or the post does not exist
+        """
+        return self.like_posts([(user_id, post_id)], session)[0]
+
+    def add_comments(self, comments, session=None):
+        """
+        Add a batch of comments
+        :param comments: List of dicts with userId, postId, content and optionally _id and createdAt
+        :param session: Optional session, e.g. SocialNetworkQueries.start_session()
+        :return: List of the comment ids, in input order; None for comments on posts that do not exist
+        """
+        s = self.schema
+        docs = []
+        for comment in comments:
+            docs.append({
+                "_id": _object_id(comment.get("_id")) or ObjectId(),
+                "userId": _object_id(comment["userId"]),
+                "postId": _object_id(comment["postId"]),
+                "content": comment["content"],
+                "createdAt": comment.get("createdAt") or datetime.now()
+            })
+        unique_docs = list({doc["_id"]: doc for doc in reversed(docs)}.values())
+
+        def insert(session):
+            authors = self._post_authors([doc["postId"] for doc in unique_docs], session)
+            existing = self._existing_ids(self.comments, [doc["_id"] for doc in unique_docs], session)
+            new_comments = [doc for doc in unique_docs if doc["postId"] in authors and doc["_id"] not in existing]
+            if new_comments:
+                self.comments.insert_many([s.fields(doc) for doc in new_comments], session=session)
+
+            self._inc(self.posts, s.f("commentCount"), Counter(doc["postId"] for doc in new_comments), session)
+
+            deltas = {}
+            for doc in new_comments:
+                deltas.setdefault(doc["userId"], Counter())["commentCount"] += 1
+                deltas.setdefault(authors[doc["postId"]], Counter())["commentsReceived"] += 1
+            self.user_stats.increment(deltas, session)
+            return set(authors)
+
+        existing_posts = self._transaction(insert, session)
+
+        return [doc["_id"] if doc["postId"] in existing_posts else None for doc in docs]
+
+    def add_comment(self, user_id, post_id, content, comment_id=None, session=None):
+        """
+        Add a comment to a post
+        :param comment_id: Client-generated _id, makes retries idempotent
+        :return: ObjectId of the comment, None if the post does not exist
+        """
+        return self.add_comments([{"_id": comment_id, "userId": user_id, "postId": post_id, "content": content}],
+                                 session)[0]
+
+
+class MicroBatcher:
+    def __init__(self, writes, max_batch_size=500, max_delay_ms=5):
+        """
+        Collects single writes from many threads into batches for SocialNetworkWrites.
+        A batch is flushed when it reaches max_batch_size or its oldest write
+        has waited max_delay_ms.
+        :param writes: SocialNetworkWrites instance
+        """
+        self.writes = writes
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.batch_methods = {
+            "posts": writes.create_posts,
+            "likes": writes.like_posts,
+            "comments": writes.add_comments
+        }
+        self.pending = {kind: [] for kind in self.batch_methods}
+        self.oldest = {kind: None for kind in self.batch_methods}
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _submit(self, kind, item):
+        future = Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("MicroBatcher is closed")
+            if not self.pending[kind]:
+                self.oldest[kind] = time.monotonic()
+            self.pending[kind].append((item, future))
+            # Wake the flush thread to start the delay timer or flush a full batch
+            if len(self.pending[kind]) in (1, self.max_batch_size):
+                self.condition.notify()
+        return future
+
+    def create_post(self, user_id, topic_id, content, post_id=None):
+        """Queue a post; the future resolves to its ObjectId"""
+        return self._submit("posts", {"_id": post_id, "userId": user_id, "topicId": topic_id, "content": content})
+
+    def like_post(self, user_id, post_id):
+        """Queue a like; the future resolves to True if the like is new"""
+        return self._submit("likes", (user_id, post_id))
+
+    def add_comment(self, user_id, post_id, content, comment_id=None):
+        """Queue a comment; the future resolves to its ObjectId"""
+        return self._submit("comments", {"_id": comment_id, "userId": user_id, "postId": post_id, "content": content})
+
+    def _due(self, now):
+        """Batches that are full or have waited long enough"""
+        return [kind for kind, items in self.pending.items()
+                if items and (len(items) >= self.max_batch_size or self.closed
+                              or now - self.oldest[kind] >= self.max_delay)]
+
+    def _wait_time(self, now):
+        """Seconds until the oldest pending batch is due, None if nothing is pending"""
+        oldest = [self.oldest[kind] for kind, items in self.pending.items() if items]
+        if not oldest:
+            return None
+        return max(0.0, min(oldest) + self.max_delay - now)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                due = self._due(time.monotonic())
+                while not due:
+                    if self.closed:
+                        return
+                    self.condition.wait(self._wait_time(time.monotonic()))
+                    due = self._due(time.monotonic())
+                batches = {}
+                for kind in due:
+                    batches[kind] = self.pending[kind][:self.max_batch_size]
+                    self.pending[kind] = self.pending[kind][self.max_batch_size:]
+                    self.oldest[kind] = time.monotonic() if self.pending[kind] else None
+
+            for kind, batch in batches.items():
+                try:
+                    results = self.batch_methods[kind]([item for item, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        future.set_exception(e)
+                else:
+                    for (_, future), result in zip(batch, results):
+                        future.set_result(result)
+
+    def close(self):
+        """Flush everything queued and stop the flush thread"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()